@@ -2,6 +2,7 @@ import streamlit as st
 from streamlit_router import StreamlitRouter
 
 from schulwege.endpoints.database import get_engine, init_db
+from schulwege.endpoints.jobs import get_job_executor
 from schulwege.routes.home import home
 from schulwege.routes.project import project
 from schulwege.routes.new import new
@@ -21,4 +22,6 @@ def main():
 if __name__ == "__main__":
     engine = get_engine()
     init_db(engine)
+    # start the workers with the app, so queued and abandoned jobs are picked up
+    get_job_executor()
     main()
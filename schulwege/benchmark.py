@@ -0,0 +1,523 @@
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import multiprocessing
+import os
+import platform
+import re
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from dotenv import load_dotenv
+import numpy as np
+import polyline
+from scipy.spatial import Delaunay
+from sqlalchemy import delete
+from streamlit.logger import set_log_level
+
+from schulwege.components.maps import segment_heatmap
+from schulwege.endpoints.database import get_engine, get_session, init_db
+from schulwege.endpoints.graph_store import (
+    NETWORK_FILTERS,
+    load_graph_store,
+    write_graph_store,
+)
+from schulwege.endpoints.nominatim import get_top_location_batch
+from schulwege.endpoints.projects import save_project
+from schulwege.endpoints.routing import (
+    NETWORK_MODALITIES,
+    compute_modality_routes,
+    load_model_config,
+    load_ring_network,
+    segments_from_routes,
+)
+from schulwege.endpoints.vector_tiles import build_project_tiles, load_project_tile_meta
+from schulwege.models.itinerary import CachedItinerary
+from schulwege.models.location import Location
+
+CENTER = (52.39, 13.06)
+METERS_PER_DEGREE = 111320
+
+
+def meters_to_coordinates(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Convert east/north offsets in meters from the center to (lat, lon) coordinates."""
+    lat = CENTER[0] + y / METERS_PER_DEGREE
+    lon = CENTER[1] + x / (METERS_PER_DEGREE * np.cos(np.radians(CENTER[0])))
+    return np.column_stack((lat, lon))
+
+
+def synthetic_graph(
+    kind: str, num_nodes: int, spacing: float, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Generate a road graph around the center.
+
+    A ``grid`` graph is a jittered street grid with some streets left out, a ``planar``
+    graph is the Delaunay triangulation of uniformly scattered nodes. Both cover a square
+    with a side of ``sqrt(num_nodes) * spacing`` meters and every street is walkable in
+    both directions.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The source and target node
+            ids of all edges, the node ids and the (lat, lon) coordinates of all nodes.
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(num_nodes)))
+    extent = side * spacing
+    if kind == "grid":
+        rows, cols = np.divmod(np.arange(side * side), side)
+        x = cols * spacing - extent / 2 + rng.normal(0, spacing / 10, side * side)
+        y = rows * spacing - extent / 2 + rng.normal(0, spacing / 10, side * side)
+        nodes = np.arange(side * side).reshape(side, side)
+        u = np.concatenate((nodes[:, :-1].ravel(), nodes[:-1, :].ravel()))
+        v = np.concatenate((nodes[:, 1:].ravel(), nodes[1:, :].ravel()))
+        keep = rng.random(len(u)) >= 0.1
+        u, v = u[keep], v[keep]
+    elif kind == "planar":
+        x = rng.uniform(-extent / 2, extent / 2, num_nodes)
+        y = rng.uniform(-extent / 2, extent / 2, num_nodes)
+        simplices = Delaunay(np.column_stack((x, y))).simplices
+        pairs = np.sort(np.concatenate([simplices[:, [i, (i + 1) % 3]] for i in range(3)]), axis=1)
+        u, v = np.unique(pairs, axis=0).T
+    else:
+        raise ValueError(f"Unknown graph kind: {kind}")
+
+    node_ids = np.arange(1, len(x) + 1, dtype=np.int64) * 10
+    sources = node_ids[np.concatenate((u, v))]
+    targets = node_ids[np.concatenate((v, u))]
+    return sources, targets, node_ids, meters_to_coordinates(x, y)
+
+
+def synthetic_addresses(
+    node_coords: np.ndarray, num_addresses: int, seed: int = 0
+) -> Dict[str, Tuple[float, float]]:
+    """Scatter addresses a few meters next to random nodes of a graph.
+
+    Returns:
+        Dict[str, Tuple[float, float]]: The coordinates of every address.
+    """
+    rng = np.random.default_rng(seed + 1)
+    nodes = rng.integers(0, len(node_coords), num_addresses)
+    offsets = rng.normal(0, 20, (num_addresses, 2)) / METERS_PER_DEGREE
+    coords = node_coords[nodes] + offsets
+    return {
+        f"Teststraße {i + 1}, 14467 Teststadt": (float(lat), float(lon))
+        for i, (lat, lon) in enumerate(coords)
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answer after the configured latency of the server and without request logging.
+
+    Connections are kept alive like by the real services, so the pooled sessions of the
+    clients are measured as they are used in production.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def respond(self, data):
+        time.sleep(self.server.latency)
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NominatimHandler(StandInHandler):
+    """Answer ``/search`` like Nominatim from the known synthetic addresses."""
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        coordinates = self.server.addresses.get(query)
+        if coordinates is None:
+            self.respond([])
+            return
+        lat, lon = coordinates
+        self.respond(
+            [
+                {
+                    "place_id": 1,
+                    "osm_type": "node",
+                    "osm_id": 1,
+                    "lat": str(lat),
+                    "lon": str(lon),
+                    "name": "",
+                    "display_name": query,
+                    "address": {"road": query.split(",")[0], "city": "Teststadt"},
+                }
+            ]
+        )
+
+
+class OpenTripPlannerHandler(StandInHandler):
+    """Answer plan queries like OpenTripPlanner with a walk-bus-walk itinerary.
+
+    The bus runs between stops on a 1 km raster, so the walks to and from the stops are
+    shared by nearby addresses like in real itineraries.
+    """
+
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["query"]
+        (from_lat, from_lon), (to_lat, to_lon) = [
+            (float(lat), float(lon))
+            for lat, lon in re.findall(r"lat: ([-\d.]+), lon: ([-\d.]+)", query)[:2]
+        ]
+        raster = 1000 / METERS_PER_DEGREE
+        start_stop = (round(from_lat / raster) * raster, round(from_lon / raster) * raster)
+        end_stop = (round(to_lat / raster) * raster, round(to_lon / raster) * raster)
+        legs = [
+            ("WALK", (from_lat, from_lon), start_stop),
+            ("BUS", start_stop, end_stop),
+            ("WALK", end_stop, (to_lat, to_lon)),
+        ]
+        start = datetime(2025, 1, 6, 7, 0)
+        self.respond(
+            {
+                "data": {
+                    "plan": {
+                        "itineraries": [
+                            {
+                                "start": start.isoformat(),
+                                "end": (start + timedelta(minutes=30)).isoformat(),
+                                "legs": [
+                                    {
+                                        "mode": mode,
+                                        "from": {"name": "", "lat": a[0], "lon": a[1]},
+                                        "to": {"name": "", "lat": b[0], "lon": b[1]},
+                                        "legGeometry": {
+                                            "length": 10,
+                                            "points": polyline.encode(
+                                                np.linspace(a, b, 10).tolist()
+                                            ),
+                                        },
+                                    }
+                                    for mode, a, b in legs
+                                ],
+                            }
+                        ]
+                    }
+                }
+            }
+        )
+
+
+def start_stand_in(
+    handler: type, latency: float, **attributes
+) -> Tuple[multiprocessing.Process, int]:
+    """Start a local service stand-in on a free port.
+
+    The stand-in serves from a forked process, so it does not compete with the
+    benchmarked client for the interpreter lock.
+
+    Returns:
+        Tuple[multiprocessing.Process, int]: The serving process and its port.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.latency = latency
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    process = multiprocessing.get_context("fork").Process(target=server.serve_forever, daemon=True)
+    process.start()
+    server.socket.close()
+    return process, server.server_address[1]
+
+
+def get_commit() -> Tuple[str, bool]:
+    """Get the checked out commit and whether the working tree has uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def prepare_environment(args: argparse.Namespace, work_dir: str) -> dict:
+    """Point the application at a fresh database, graph store and model config.
+
+    Returns:
+        dict: The model config of the benchmark.
+    """
+    model_config = load_model_config()
+    model_config["segment_counting"] = args.segment_counting
+    model_config["vector_tiles"] = {**model_config.get("vector_tiles", {}), "enabled": True}
+    model_config_file = os.path.join(work_dir, "model_config.json")
+    with open(model_config_file, "w") as f:
+        json.dump(model_config, f, indent=4)
+    os.environ.update(
+        {
+            "DATA_FOLDER": work_dir,
+            "GRAPH_STORE_DIR": os.path.join(work_dir, "graph_store"),
+            "TILE_DIR": os.path.join(work_dir, "tiles"),
+            "OTP_DATA_DIR": os.path.join(work_dir, "opentripplanner"),
+            "SQL_DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'schulwege.db')}",
+            "MODEL_CONFIG_FILE": model_config_file,
+            "ROUTING_BACKEND": args.backend,
+        }
+    )
+    return model_config
+
+
+def run_benchmark(args: argparse.Namespace, work_dir: str) -> dict:
+    """Run the project pipeline stage by stage on synthetic data and time every stage.
+
+    Every repetition starts without cached geocodes, itineraries or graph store mappings,
+    so all repetitions do the same work.
+
+    Returns:
+        dict: The benchmark results.
+    """
+    model_config = prepare_environment(args, work_dir)
+    init_db(get_engine())
+
+    sources, targets, node_ids, node_coords = synthetic_graph(
+        args.graph, args.nodes, args.spacing, seed=args.seed
+    )
+    for network_type in NETWORK_FILTERS:
+        write_graph_store(
+            os.environ["GRAPH_STORE_DIR"],
+            network_type,
+            sources,
+            targets,
+            node_ids,
+            node_coords,
+            source=f"synthetic {args.graph} graph (seed {args.seed})",
+        )
+    addresses = synthetic_addresses(node_coords, args.addresses, seed=args.seed)
+    address_list = list(addresses)
+
+    nominatim, nominatim_port = start_stand_in(NominatimHandler, args.latency, addresses=addresses)
+    otp, otp_port = start_stand_in(OpenTripPlannerHandler, args.latency)
+    os.environ["NOMINATIM_HOST_PORT"] = str(nominatim_port)
+    os.environ["OTP_HOST_PORT"] = str(otp_port)
+
+    timings = defaultdict(list)
+
+    def timed(stage: str, func: Callable):
+        start = time.perf_counter()
+        result = func()
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    edge_flow = model_config["segment_counting"] == "edge_flow"
+    precision = model_config.get("coordinate_precision", 5)
+    tile_config = model_config["vector_tiles"]
+    sizes = {}
+    try:
+        for repetition in range(args.repeat):
+            print(f"Repetition {repetition + 1}/{args.repeat}...")
+            session = get_session()
+            session.execute(delete(CachedItinerary))
+            session.commit()
+            session.close()
+            school = Location(name="Testschule", lat=CENTER[0], lon=CENTER[1], osm_id=0)
+
+            locations = timed(
+                "geocoding", lambda: get_top_location_batch(address_list, use_cache=False)
+            )
+
+            def load_networks():
+                load_graph_store.clear()
+                networks = {}
+                for i, route_cfg in enumerate(model_config["routing"]):
+                    if route_cfg["modality"] not in NETWORK_MODALITIES:
+                        continue
+                    max_radius = route_cfg.get("max_radius", -1)
+                    networks[i] = load_ring_network(
+                        school,
+                        locations,
+                        route_cfg.get("min_radius", 0),
+                        float("inf") if max_radius == -1 else max_radius,
+                        *NETWORK_MODALITIES[route_cfg["modality"]],
+                    )
+                return networks
+
+            networks = timed("graph_loading", load_networks)
+
+            routes, route_modalities, edge_segments = [], [], []
+            service_routes = [{} for _ in locations]
+            for i, route_cfg in enumerate(model_config["routing"]):
+                location_routes, modality_edge_segments = timed(
+                    f"routing:{route_cfg['modality']}",
+                    lambda: compute_modality_routes(
+                        school, locations, route_cfg, edge_flow=edge_flow, network=networks.get(i)
+                    ),
+                )
+                modality = route_cfg.get("modality_display_name", route_cfg["modality"])
+                for stored, routes_of_location in zip(service_routes, location_routes):
+                    if route_cfg["modality"] not in NETWORK_MODALITIES:
+                        stored[json.dumps(route_cfg, sort_keys=True)] = routes_of_location
+                    routes.extend(routes_of_location)
+                    route_modalities.extend([modality] * len(routes_of_location))
+                edge_segments.extend(modality_edge_segments)
+
+            segments = timed(
+                "segment_counting",
+                lambda: segments_from_routes(
+                    routes,
+                    route_modalities,
+                    edge_segments,
+                    precision=precision,
+                    min_frequency=model_config.get("min_segment_frequency", 1),
+                ),
+            )
+            project_id = timed(
+                "persistence",
+                lambda: save_project(
+                    school,
+                    "Benchmark",
+                    segments,
+                    address_list,
+                    locations,
+                    service_routes,
+                ),
+            )
+            timed(
+                "vector_tiles",
+                lambda: build_project_tiles(
+                    project_id,
+                    segments,
+                    min_zoom=tile_config.get("min_zoom", 11),
+                    max_zoom=tile_config.get("max_zoom", 16),
+                ),
+            )
+            if segments:
+                timed("heatmap", lambda: segment_heatmap(segments)[0].get_root().render())
+
+            sizes = {
+                "addresses": len(address_list),
+                "nodes": len(node_ids),
+                "edges": len(sources),
+                "route_points": sum(len(route) for route in routes),
+                "segments": len(segments),
+                "tiles": (
+                    load_project_tile_meta(project_id).get("num_tiles", 0) if segments else 0
+                ),
+            }
+    finally:
+        nominatim.terminate()
+        otp.terminate()
+
+    commit, dirty = get_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            name: value
+            for name, value in vars(args).items()
+            if name not in ("output", "compare", "work_dir")
+        },
+        "sizes": sizes,
+        "stages": {
+            stage: {
+                "seconds": seconds,
+                "min": min(seconds),
+                "median": statistics.median(seconds),
+                "mean": statistics.mean(seconds),
+            }
+            for stage, seconds in timings.items()
+        },
+    }
+
+
+def compare_results(baseline: dict, results: dict) -> List[str]:
+    """Compare the median stage timings of two benchmark results line by line."""
+    lines = [f"{'Stage':<32}{baseline['commit']:>12}{results['commit']:>12}{'Change':>10}"]
+    for stage, timing in results["stages"].items():
+        before = baseline["stages"].get(stage, {}).get("median")
+        after = timing["median"]
+        if before is None:
+            lines.append(f"{stage:<32}{'-':>12}{after:>12.3f}{'-':>10}")
+            continue
+        change = (after - before) / before * 100 if before > 0 else 0.0
+        lines.append(f"{stage:<32}{before:>12.3f}{after:>12.3f}{change:>+9.1f}%")
+    return lines
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(
+        description="Benchmark the project pipeline on synthetic road graphs and addresses, "
+        "with local stand-ins for Nominatim and OpenTripPlanner."
+    )
+    parser.add_argument("--graph", default="grid", choices=["grid", "planar"])
+    parser.add_argument("--nodes", type=int, default=40000, help="Number of graph nodes.")
+    parser.add_argument(
+        "--spacing", type=float, default=60, help="Mean distance between nodes in meters."
+    )
+    parser.add_argument("--addresses", type=int, default=1000, help="Number of addresses.")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.005,
+        help="Response latency of the Nominatim and OpenTripPlanner stand-ins in seconds.",
+    )
+    parser.add_argument("--backend", default="csr", choices=["csr", "networkx"])
+    parser.add_argument(
+        "--segment-counting",
+        default=load_model_config().get("segment_counting", "routes"),
+        choices=["edge_flow", "routes"],
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output",
+        help="JSON file the results are written to "
+        "(default: DATA_FOLDER/benchmarks/<commit>.json).",
+    )
+    parser.add_argument("--compare", help="Earlier results to compare the median timings with.")
+    parser.add_argument(
+        "--work-dir", help="Directory for the database, graph store and tiles (default: temporary)."
+    )
+    args = parser.parse_args()
+    set_log_level("error")
+
+    output = args.output or os.path.join(
+        os.getenv("DATA_FOLDER", "./data"), "benchmarks", f"{get_commit()[0]}.json"
+    )
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+        results = run_benchmark(args, os.path.abspath(args.work_dir))
+    else:
+        with tempfile.TemporaryDirectory(prefix="schulwege-benchmark-") as work_dir:
+            results = run_benchmark(args, work_dir)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(", ".join(f"{name}: {value}" for name, value in results["sizes"].items()))
+    for stage, timing in results["stages"].items():
+        print(f"{stage:<32}{timing['median']:>10.3f} s (min {timing['min']:.3f} s)")
+    print(f"Results written to {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("\n".join(compare_results(baseline, results)))
+
+
+if __name__ == "__main__":
+    main()
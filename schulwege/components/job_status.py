@@ -0,0 +1,45 @@
+import json
+import time
+import streamlit as st
+from streamlit_router import StreamlitRouter
+
+from schulwege.endpoints.jobs import get_job, retry_job
+
+
+@st.fragment(run_every=1)
+def job_status(router: StreamlitRouter, job_id: int, state_key: str):
+    """
+    Polls a project job until it is finished and redirects to its project.
+    Args:
+        router: The StreamlitRouter instance.
+        job_id: The id of the job.
+        state_key: The session state key holding the job id, removed once the job is done.
+    """
+    job = get_job(job_id)
+    payload = json.loads(job.payload)
+    action = "aktualisiert" if "project_id" in payload else "erstellt"
+    messages = json.loads(job.messages) if job.messages else []
+    if job.status in ("queued", "running"):
+        with st.status(f"Projekt wird {action}...", state="running", expanded=True):
+            st.write(job.progress)
+    for message in messages:
+        st.warning(message)
+    if job.status == "failed":
+        st.error(
+            f"Das Projekt konnte nicht {action} werden. Bereits abgeschlossene Schritte "
+            "werden beim erneuten Versuch übersprungen."
+        )
+        force = st.checkbox(
+            "Fehlerhafte Adressen ignorieren",
+            value=payload["force"],
+            key=f"job_{job_id}_force",
+        )
+        if st.button("Erneut versuchen", key=f"job_{job_id}_retry"):
+            retry_job(job_id, force=force)
+            st.rerun(scope="fragment")
+    if job.status == "done":
+        del st.session_state[state_key]
+        st.success(f"Projekt wurde erfolgreich {action}! Weiterleitung...")
+        # wait 3s before redirecting
+        time.sleep(3)
+        router.redirect(*router.build("project", {"id": job.project_id}))
@@ -4,48 +4,70 @@ import branca
 from schulwege.models.project import Project
 from schulwege.models.segment import Segment
 import folium
+from folium.plugins import VectorGridProtobuf
 import branca.colormap as cm
 from collections import defaultdict
+import io
+import json
+import os
+import tempfile
+import zipfile
 
-
-def overlay_segments(
-    segments: List[Segment],
-) -> List[Tuple[Tuple[float, float], Tuple[float, float], int, str]]:
-    """Overlay segments and sum their frequencies."""
-
-    segment_dict = defaultdict(int)
-    for segment in segments:
-        start = (segment.lat_from, segment.lon_from)
-        end = (segment.lat_to, segment.lon_to)
-        segment_dict[(start, end, segment.modality)] += segment.frequency
-
-    overlaid_segments = [
-        (start, end, frequency, modality)
-        for (start, end, modality), frequency in segment_dict.items()
-    ]
-    return overlaid_segments
+import geopandas as gpd
+import pandas as pd
+import shapely
 
 
 def merge_polylines(segments: List[Segment]) -> List[Tuple[List[Tuple[float, float]], int]]:
+    """Stitch the overlaid segments into as few polylines as possible.
 
+    A polyline continues through every point with exactly one incoming and one outgoing
+    segment of the same frequency, so each maximal chain of such points becomes a single
+    line. The chains are followed through an index of segment endpoints, which touches
+    every segment once. Segments are visited in sorted order, so the result does not
+    depend on the order of the input.
+    """
     segment_dict = defaultdict(int)
     for segment in segments:
         start = (segment.lat_from, segment.lon_from)
         end = (segment.lat_to, segment.lon_to)
         segment_dict[(start, end)] += segment.frequency
 
-    overlaid_segments = [
-        (start, end, frequency) for (start, end), frequency in segment_dict.items()
-    ]
+    overlaid_segments = sorted(segment_dict)
+    outgoing = defaultdict(list)
+    incoming = defaultdict(list)
+    for start, end in overlaid_segments:
+        outgoing[start].append(end)
+        incoming[end].append(start)
+
+    def is_joint(point: Tuple[float, float]) -> bool:
+        if len(incoming[point]) != 1 or len(outgoing[point]) != 1:
+            return False
+        return (
+            segment_dict[(incoming[point][0], point)] == segment_dict[(point, outgoing[point][0])]
+        )
 
     merged_polylines = []
-    for start, end, frequency in overlaid_segments:
-        for polyline, line_frequency in merged_polylines:
-            if polyline[-1] == start and line_frequency == frequency:
-                polyline.append(end)
+    visited = set()
+
+    def follow(start: Tuple[float, float], end: Tuple[float, float]) -> None:
+        frequency = segment_dict[(start, end)]
+        polyline = [start]
+        while (start, end) not in visited:
+            visited.add((start, end))
+            polyline.append(end)
+            if not is_joint(end):
                 break
-        else:
-            merged_polylines.append(([start, end], frequency))
+            start, end = end, outgoing[end][0]
+        merged_polylines.append((polyline, frequency))
+
+    for start, end in overlaid_segments:
+        if (start, end) not in visited and not is_joint(start):
+            follow(start, end)
+    # whatever is left forms closed rings without a chain start
+    for start, end in overlaid_segments:
+        if (start, end) not in visited:
+            follow(start, end)
 
     return merged_polylines
 
@@ -62,7 +84,45 @@ def get_center_coordinates(segments: List[Segment]) -> Tuple[float, float]:
     return center_lat, center_lon
 
 
-def segment_heatmap(segments: List[Segment], n_colors: int = 10) -> Tuple[folium.Map, str]:
+def polylines_to_geojson(
+    polylines: List[Tuple[List[Tuple[float, float]], dict]], precision: int = 5
+) -> dict:
+    """Build a GeoJSON FeatureCollection of (lat, lon) polylines and their properties.
+
+    Coordinates are rounded to ``precision`` decimals (about 1 m for 5) to keep the
+    payload sent to the browser small.
+    """
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "id": i,
+                "properties": properties,
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": [
+                        [round(lon, precision), round(lat, precision)] for lat, lon in polyline
+                    ],
+                },
+            }
+            for i, (polyline, properties) in enumerate(polylines)
+        ],
+    }
+
+
+def geojson_payload_size(map: folium.Map) -> int:
+    """Get the size in bytes of the GeoJSON layers of a map."""
+    return sum(
+        len(json.dumps(child.data, separators=(",", ":")))
+        for child in map._children.values()
+        if isinstance(child, folium.GeoJson)
+    )
+
+
+def segment_heatmap(
+    segments: List[Segment], n_colors: int = 10, precision: int = 5
+) -> Tuple[folium.Map, str]:
 
     merged_polylines = merge_polylines(segments)
     center_coordinates = get_center_coordinates(segments)
@@ -75,26 +135,31 @@ def segment_heatmap(segments: List[Segment], n_colors: int = 10) -> Tuple[folium
         vmax=max_freq,
     )
     step_colormap = linear_colormap.to_step(n=n_colors)
-    for polyline, frequency in merged_polylines:
-        color = step_colormap(frequency)
-        folium.PolyLine(
-            locations=polyline,
-            color=color,
-            weight=5,
-            opacity=0.8,
-            tooltip=f"Häufigkeit: {frequency}",
-        ).add_to(map)
+    folium.GeoJson(
+        polylines_to_geojson(
+            [(polyline, {"frequency": frequency}) for polyline, frequency in merged_polylines],
+            precision=precision,
+        ),
+        style_function=lambda feature: {
+            "color": step_colormap(feature["properties"]["frequency"]),
+            "weight": 5,
+            "opacity": 0.8,
+        },
+        tooltip=folium.GeoJsonTooltip(fields=["frequency"], aliases=["Häufigkeit:"]),
+    ).add_to(map)
 
     return map, step_colormap._repr_html_()
 
 
-def segment_modality_map(segments: List[Segment]) -> Tuple[folium.Map, str]:
+def segment_modality_map(segments: List[Segment], precision: int = 5) -> Tuple[folium.Map, str]:
 
     center_coordinates = get_center_coordinates(segments)
     map = folium.Map(location=center_coordinates, zoom_start=13)
     all_modalities = set(segment.modality for segment in segments)
     num_modalities = len(all_modalities)
-    overlaid_segments = overlay_segments(segments)
+    segments_by_modality = defaultdict(list)
+    for segment in segments:
+        segments_by_modality[segment.modality].append(segment)
 
     linear_colormap = cm.LinearColormap(
         colors=["blue", "orange", "purple"],
@@ -103,15 +168,24 @@ def segment_modality_map(segments: List[Segment]) -> Tuple[folium.Map, str]:
     )
     modality_to_index = {modality: index for index, modality in enumerate(all_modalities)}
     step_colormap = linear_colormap.to_step(n=num_modalities)
-    for start, end, frequency, modality in overlaid_segments:
-        color = step_colormap(modality_to_index[modality])
-        folium.PolyLine(
-            locations=[start, end],
-            color=color,
-            weight=5,
-            opacity=0.8,
-            tooltip=f"Modality: {modality}, Frequency: {frequency}",
-        ).add_to(map)
+    folium.GeoJson(
+        polylines_to_geojson(
+            [
+                (polyline, {"modality": modality, "frequency": frequency})
+                for modality, modality_segments in segments_by_modality.items()
+                for polyline, frequency in merge_polylines(modality_segments)
+            ],
+            precision=precision,
+        ),
+        style_function=lambda feature: {
+            "color": step_colormap(modality_to_index[feature["properties"]["modality"]]),
+            "weight": 5,
+            "opacity": 0.8,
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=["modality", "frequency"], aliases=["Modality:", "Frequency:"]
+        ),
+    ).add_to(map)
 
     legend_html = "<div style='font-weight: bold; margin-bottom: 8px;'>"
     # make a single row legend
@@ -123,6 +197,70 @@ def segment_modality_map(segments: List[Segment]) -> Tuple[folium.Map, str]:
     return map, legend_html
 
 
+def vector_tile_layer(url: str, meta: dict, style_function: str) -> VectorGridProtobuf:
+    """Build a layer of precomputed segment vector tiles styled by a JavaScript function."""
+    options = f"""{{
+        "vectorTileLayerStyles": {{"segments": {style_function}}},
+        "rendererFactory": L.canvas.tile,
+        "minNativeZoom": {meta["min_zoom"]},
+        "maxNativeZoom": {meta["max_zoom"]}
+    }}"""
+    return VectorGridProtobuf(url, name="Segmente", options=options)
+
+
+def tile_heatmap(tile_url: str, meta: dict, n_colors: int = 10) -> Tuple[folium.Map, str]:
+    """Frequency heatmap drawn from the ``frequency`` tileset of a project."""
+    (min_lat, min_lon), (max_lat, max_lon) = meta["bounds"]
+    map = folium.Map(location=((min_lat + max_lat) / 2, (min_lon + max_lon) / 2), zoom_start=13)
+    frequencies = meta["frequencies"]
+    linear_colormap = cm.LinearColormap(
+        colors=["green", "yellow", "red"],
+        vmin=min(frequencies),
+        vmax=max(frequencies),
+    )
+    step_colormap = linear_colormap.to_step(n=n_colors)
+    colors = json.dumps({frequency: step_colormap(frequency) for frequency in frequencies})
+    vector_tile_layer(
+        f"{tile_url}/frequency/{{z}}/{{x}}/{{y}}.pbf",
+        meta,
+        "function(properties) { return {color: (%s)[properties.frequency], weight: 5, opacity: 0.8}; }"
+        % colors,
+    ).add_to(map)
+
+    return map, step_colormap._repr_html_()
+
+
+def tile_modality_map(tile_url: str, meta: dict) -> Tuple[folium.Map, str]:
+    """Modality map drawn from the ``modality`` tileset of a project."""
+    (min_lat, min_lon), (max_lat, max_lon) = meta["bounds"]
+    map = folium.Map(location=((min_lat + max_lat) / 2, (min_lon + max_lon) / 2), zoom_start=13)
+    modalities = meta["modalities"]
+    linear_colormap = cm.LinearColormap(
+        colors=["blue", "orange", "purple"],
+        vmin=0,
+        vmax=len(modalities) - 1,
+    )
+    step_colormap = linear_colormap.to_step(n=len(modalities))
+    modality_to_index = {modality: index for index, modality in enumerate(modalities)}
+    colors = json.dumps(
+        {modality: step_colormap(index) for modality, index in modality_to_index.items()}
+    )
+    vector_tile_layer(
+        f"{tile_url}/modality/{{z}}/{{x}}/{{y}}.pbf",
+        meta,
+        "function(properties) { return {color: (%s)[properties.modality], weight: 5, opacity: 0.8}; }"
+        % colors,
+    ).add_to(map)
+
+    legend_html = "<div style='font-weight: bold; margin-bottom: 8px;'>"
+    for modality, index in modality_to_index.items():
+        color = step_colormap(index)
+        legend_html += f"<span style='background-color:{color};padding:5px;margin-right:5px;color:white;'>{modality}</span>"
+    legend_html += "</div>"
+
+    return map, legend_html
+
+
 def add_model_config_hints(map: folium.Map, project: Project, model_config: dict) -> None:
 
     routing = model_config.get("routing", [])
@@ -141,65 +279,69 @@ def add_model_config_hints(map: folium.Map, project: Project, model_config: dict
     return map
 
 
-def export_project(project: Project) -> str:
-    """Export project data to a temporary ZIP file and return the file path.
-    In the ZIP file, include a CSV file with segment data and a JSON file with project metadata.
+EXPORT_FORMATS = {
+    "ZIP (CSV + JSON)": ("zip", "application/zip"),
+    "GeoParquet": ("parquet", "application/vnd.apache.parquet"),
+    "GeoPackage": ("gpkg", "application/geopackage+sqlite3"),
+    "FlatGeobuf": ("fgb", "application/octet-stream"),
+}
+
+
+def segments_to_geodataframe(segments: pd.DataFrame) -> gpd.GeoDataFrame:
+    """Turn a segment table into line geometries in WGS 84."""
+    coords = segments[["lon_from", "lat_from", "lon_to", "lat_to"]].to_numpy().reshape(-1, 2, 2)
+    return gpd.GeoDataFrame(
+        segments[["id", "modality", "frequency"]],
+        geometry=shapely.linestrings(coords),
+        crs="EPSG:4326",
+    )
+
+
+def export_project(project: Project, segments: pd.DataFrame, export_format: str) -> bytes:
+    """Export project data in memory.
+
+    The ZIP export contains a CSV file with segment data and a JSON file with project
+    metadata. The geo formats contain the segments as line features.
+
+    Args:
+        project (Project): The project.
+        segments (pd.DataFrame): The project's segments, one row per segment.
+        export_format (str): One of ``EXPORT_FORMATS``.
+    Returns:
+        bytes: The exported file.
     """
-    import csv
-    import json
-    import os
-    import tempfile
-    import zipfile
-
-    temp_dir = tempfile.mkdtemp()
-    csv_file_path = os.path.join(temp_dir, "segments.csv")
-    json_file_path = os.path.join(temp_dir, "project_metadata.json")
-    zip_file_path = os.path.join(temp_dir, f"project_{project.id}.zip")
-
-    # Write segments to CSV
-    with open(csv_file_path, mode="w", newline="", encoding="utf-8") as csv_file:
-        fieldnames = [
-            "id",
-            "lat_from",
-            "lon_from",
-            "lat_to",
-            "lon_to",
-            "modality",
-            "frequency",
-        ]
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        writer.writeheader()
-        for segment in project.segments:
-            writer.writerow(
+    buffer = io.BytesIO()
+    if export_format == "ZIP (CSV + JSON)":
+        project_metadata = {
+            "id": project.id,
+            "name": project.name,
+            "created_at": project.created_at.isoformat(),
+            "main_location": (
                 {
-                    "id": segment.id,
-                    "lat_from": segment.lat_from,
-                    "lon_from": segment.lon_from,
-                    "lat_to": segment.lat_to,
-                    "lon_to": segment.lon_to,
-                    "modality": segment.modality,
-                    "frequency": segment.frequency,
+                    "id": project.main_location.id,
+                    "name": project.main_location.name,
+                    "lat": project.main_location.lat,
+                    "lon": project.main_location.lon,
                 }
-            )
-
-    # Write project metadata to JSON
-    project_metadata = {
-        "id": project.id,
-        "name": project.name,
-        "created_at": project.created_at.isoformat(),
-        "main_location": {
-            "id": project.main_location.id,
-            "name": project.main_location.name,
-            "lat": project.main_location.lat,
-            "lon": project.main_location.lon,
-        },
-    }
-    with open(json_file_path, mode="w", encoding="utf-8") as json_file:
-        json.dump(project_metadata, json_file, indent=4)
-
-    # Create ZIP file
-    with zipfile.ZipFile(zip_file_path, mode="w") as zipf:
-        zipf.write(csv_file_path, arcname="segments.csv")
-        zipf.write(json_file_path, arcname="project_metadata.json")
-
-    return zip_file_path
+                if project.main_location
+                else None
+            ),
+        }
+        columns = ["id", "lat_from", "lon_from", "lat_to", "lon_to", "modality", "frequency"]
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as zipf:
+            zipf.writestr("segments.csv", segments[columns].to_csv(index=False))
+            zipf.writestr("project_metadata.json", json.dumps(project_metadata, indent=4))
+        return buffer.getvalue()
+
+    gdf = segments_to_geodataframe(segments)
+    if export_format == "GeoParquet":
+        gdf.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+
+    extension, _ = EXPORT_FORMATS[export_format]
+    driver = {"gpkg": "GPKG", "fgb": "FlatGeobuf"}[extension]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, f"segments.{extension}")
+        gdf.to_file(path, driver=driver, layer="segments", engine="pyogrio")
+        with open(path, "rb") as f:
+            return f.read()
@@ -28,3 +28,22 @@ def table(df: pd.DataFrame, widths: list[int] | None = None):
                 value.render(context=cols[j])
             else:
                 cols[j].write(value)
+
+
+def pagination(num_rows: int, page_size: int, key: str) -> int:
+    """Render page controls and get the offset of the first row of the current page."""
+    num_pages = max(1, -(-num_rows // page_size))
+    if key not in st.session_state or st.session_state[key] >= num_pages:
+        st.session_state[key] = 0
+
+    cols = st.columns([1, 1, 6], vertical_alignment="center")
+    if cols[0].button("← Zurück", key=f"{key}_previous", disabled=st.session_state[key] == 0):
+        st.session_state[key] -= 1
+        st.rerun()
+    if cols[1].button(
+        "Weiter →", key=f"{key}_next", disabled=st.session_state[key] >= num_pages - 1
+    ):
+        st.session_state[key] += 1
+        st.rerun()
+    cols[2].write(f"Seite {st.session_state[key] + 1} von {num_pages} ({num_rows} Einträge)")
+    return st.session_state[key] * page_size
@@ -0,0 +1,211 @@
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+
+import numpy as np
+import streamlit as st
+
+from schulwege.endpoints.csr_routing import CSRGraph
+from schulwege.endpoints.database import get_session
+from schulwege.endpoints.projects import build_tiles, geocode_addresses, save_project
+from schulwege.endpoints.routing import NETWORK_MODALITIES, get_road_network, load_model_config
+from schulwege.endpoints.snapping import snap_locations
+from schulwege.models.location import Location
+from schulwege.models.project import Project
+from schulwege.models.segment import Segment
+
+
+def get_modality_display_name(modality: str) -> str:
+    """Get the display name of a modality from the routing configuration."""
+    for route_cfg in load_model_config().get("routing", []):
+        if route_cfg.get("modality") == modality:
+            return route_cfg.get("modality_display_name", modality)
+    return modality
+
+
+def compute_school_assignment(
+    schools: List[Location],
+    locations: List[Location],
+    modality: str = "walk",
+    assigned_schools: Optional[List[Optional[int]]] = None,
+    progress_callback=None,
+) -> Tuple[np.ndarray, List[List[Segment]]]:
+    """Assign every location to a school and compute the edge flows of all schools.
+
+    A single multi-source search from all schools yields the network-nearest school of
+    every node together with a shortest path forest. The subtree sums of the forest are
+    the edge flows of all routes to the nearest schools at once. Locations with a given
+    school that is not their nearest one are added from the shortest path tree of that
+    school.
+
+    Args:
+        schools (List[Location]): The schools.
+        locations (List[Location]): The addresses.
+        modality (str): The network modality, one of ``NETWORK_MODALITIES``.
+        assigned_schools (Optional[List[Optional[int]]]): The index of the given school of
+            every location, None for the network-nearest school.
+    Returns:
+        Tuple[np.ndarray, List[List[Segment]]]: The school index of every location, -1 for
+            locations off the network or unreachable, and the segments of every school.
+    """
+    network_type, label = NETWORK_MODALITIES[modality]
+    modality_display_name = get_modality_display_name(modality)
+    if progress_callback:
+        progress_callback(f"Lade Straßennetz für {label}...")
+    network = get_road_network(schools[0], schools[1:] + locations, network_type=network_type)
+    if not isinstance(network, CSRGraph):
+        network = CSRGraph.from_networkx(network)
+
+    school_nodes, _ = snap_locations(network, schools)
+    school_positions = network.index_of(school_nodes)
+    nodes, snap_distances = snap_locations(network, locations)
+    positions = network.index_of(nodes)
+    max_snap_distance = load_model_config().get("max_snap_distance", 500)
+    on_network = snap_distances <= max_snap_distance
+    if not on_network.all():
+        st.warning(
+            f"{(~on_network).sum()} Adressen liegen mehr als {max_snap_distance} m vom "
+            f"Straßennetz entfernt und werden nicht berücksichtigt."
+        )
+
+    if progress_callback:
+        progress_callback(
+            f"Berechne {label} von {len(schools)} Schulen zu {on_network.sum()} Adressen..."
+        )
+    dist, pred, sources = network.shortest_path_forest(school_nodes)
+    school_of_position = np.full(len(network), -1, dtype=np.int64)
+    # schools snapped to the same node share it, the first one is assigned
+    for school, position in reversed(list(enumerate(school_positions.tolist()))):
+        school_of_position[position] = school
+    reachable = on_network & np.isfinite(dist[positions])
+    assignment = np.where(reachable, school_of_position[np.maximum(sources[positions], 0)], -1)
+
+    given = np.full(len(locations), -1, dtype=np.int64)
+    if assigned_schools is not None:
+        given[:] = [-1 if school is None else school for school in assigned_schools]
+    forced = on_network & (given >= 0) & (given != assignment)
+
+    flows = defaultdict(Counter)
+    nearest = reachable & ~forced
+    flow = network.accumulate_flows(
+        pred, dist, np.bincount(positions[nearest], minlength=len(network))
+    )
+    edges = np.flatnonzero((pred >= 0) & (flow > 0))
+    for school, node_from, node_to, frequency in zip(
+        school_of_position[sources[edges]].tolist(),
+        pred[edges].tolist(),
+        edges.tolist(),
+        flow[edges].tolist(),
+    ):
+        flows[school][(node_from, node_to)] += frequency
+
+    for school in np.unique(given[forced]).tolist():
+        members = forced & (given == school)
+        tree_dist, tree_pred = network.shortest_path_tree(school_nodes[school])
+        routed = members & np.isfinite(tree_dist[positions])
+        assignment[members] = np.where(routed[members], school, -1)
+        flow = network.accumulate_flows(
+            tree_pred, tree_dist, np.bincount(positions[routed], minlength=len(network))
+        )
+        edges = np.flatnonzero((tree_pred >= 0) & (flow > 0))
+        for node_from, node_to, frequency in zip(
+            tree_pred[edges].tolist(), edges.tolist(), flow[edges].tolist()
+        ):
+            flows[school][(node_from, node_to)] += frequency
+
+    unreachable = on_network & (assignment < 0)
+    if unreachable.any():
+        st.warning(f"{unreachable.sum()} Adressen sind von keiner Schule aus erreichbar.")
+
+    node_ids, lat, lon = network.node_ids.tolist(), network.lat.tolist(), network.lon.tolist()
+    school_segments = [
+        [
+            Segment(
+                node_from=node_ids[node_from],
+                node_to=node_ids[node_to],
+                lat_from=lat[node_from],
+                lon_from=lon[node_from],
+                lat_to=lat[node_to],
+                lon_to=lon[node_to],
+                modality=modality_display_name,
+                frequency=frequency,
+            )
+            for (node_from, node_to), frequency in flows[school].items()
+        ]
+        for school in range(len(schools))
+    ]
+    return assignment, school_segments
+
+
+def create_assignment_projects(
+    schools: List[Location],
+    address_list: List[str],
+    project_name: str,
+    modality: str = "walk",
+    assigned_schools: Optional[List[Optional[int]]] = None,
+    progress_callback=None,
+    force: bool = False,
+) -> Optional[List[Project]]:
+    """Assign city-wide addresses to schools and store the result.
+
+    One project is stored per school with assigned addresses, and one combined project
+    without main location holds the segments of all schools with the school name as
+    modality. No addresses are stored with these projects, so they cannot be updated
+    address by address.
+
+    Returns:
+        Optional[List[Project]]: The combined project followed by the school projects,
+            None if addresses could not be found and ``force`` is not set.
+    """
+    geocoded = geocode_addresses(address_list, progress_callback, force)
+    if geocoded is None:
+        return None
+    found, locations = geocoded
+    assignment, school_segments = compute_school_assignment(
+        schools,
+        locations,
+        modality=modality,
+        assigned_schools=[assigned_schools[i] for i in found] if assigned_schools else None,
+        progress_callback=progress_callback,
+    )
+
+    min_frequency = load_model_config().get("min_segment_frequency", 1)
+    school_segments = [
+        [segment for segment in segments if segment.frequency >= min_frequency]
+        for segments in school_segments
+    ]
+    combined_segments = [
+        Segment(
+            lat_from=segment.lat_from,
+            lon_from=segment.lon_from,
+            lat_to=segment.lat_to,
+            lon_to=segment.lon_to,
+            modality=school.name,
+            frequency=segment.frequency,
+            node_from=segment.node_from,
+            node_to=segment.node_to,
+        )
+        for school, segments in zip(schools, school_segments)
+        for segment in segments
+    ]
+    project_ids = [
+        save_project(None, project_name, combined_segments, [], [], [], progress_callback)
+    ]
+    build_tiles(project_ids[0], combined_segments, progress_callback)
+    num_addresses = np.bincount(assignment[assignment >= 0], minlength=len(schools))
+    for school, segments, count in zip(schools, school_segments, num_addresses.tolist()):
+        if count == 0:
+            continue
+        project_id = save_project(
+            school, f"{project_name}: {school.name}", segments, [], [], [], progress_callback
+        )
+        build_tiles(project_id, segments, progress_callback)
+        project_ids.append(project_id)
+
+    session = get_session()
+    projects = [session.get(Project, project_id) for project_id in project_ids]
+    session.close()
+    st.success(
+        f"{len(locations)} Adressen wurden {len(projects) - 1} Schulen zugeordnet, "
+        f"Projekt '{project_name}' enthält alle Schulen."
+    )
+    return projects
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import streamlit as st
+
+from schulwege.endpoints.nominatim import search_nominatim
+from schulwege.models.location import Location, new_location
+
+
+class Autocomplete:
+    """Search backend for type-ahead queries shared by all sessions.
+
+    Results are kept in an LRU cache. Identical queries that are in flight at the same
+    time share a single request, and a request whose query is no longer the latest
+    input of any client is dropped before it is sent. Results are returned as raw
+    search data, so every caller builds its own objects from them.
+
+    The search matches whole tokens, so the results of a shorter query are no subset of
+    the results of a longer one in general. Cached results of a shorter query are only
+    returned as a provisional answer while the request of the longer query takes more
+    than ``provisional_after`` seconds, and never stored as its results.
+    """
+
+    def __init__(
+        self,
+        search: Callable[[str, int], List[Dict[str, Any]]],
+        maxsize: int = 1024,
+        max_workers: int = 4,
+        max_clients: int = 1000,
+        provisional_after: float = 0.5,
+    ):
+        self.search = search
+        self.maxsize = maxsize
+        self.max_clients = max_clients
+        self.provisional_after = provisional_after
+        self._cache: OrderedDict[Tuple[str, int], List[Dict[str, Any]]] = OrderedDict()
+        self._in_flight: Dict[Tuple[str, int], Future] = {}
+        self._latest: Dict[str, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.casefold().split())
+
+    def query(self, query: str, limit: int, client_id: str) -> List[Dict[str, Any]]:
+        """Get the search results of a query typed by a client.
+
+        The results may be provisional, see ``pending``.
+        """
+        key = (self.normalize(query), limit)
+        with self._lock:
+            self._latest.pop(client_id, None)
+            self._latest[client_id] = key
+            if len(self._latest) > self.max_clients:
+                self._latest.pop(next(iter(self._latest)))
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            provisional = self._provisional(key)
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch, key, query)
+                self._in_flight[key] = future
+        if provisional is None:
+            return future.result()
+        try:
+            return future.result(timeout=self.provisional_after)
+        except TimeoutError:
+            return provisional
+
+    def pending(self, query: str, limit: int) -> bool:
+        """Check whether the request of a query is still running."""
+        with self._lock:
+            return (self.normalize(query), limit) in self._in_flight
+
+    def wait(self, query: str, limit: int) -> bool:
+        """Wait for the request of a query to finish.
+
+        Returns:
+            bool: Whether a running request finished with results.
+        """
+        with self._lock:
+            future = self._in_flight.get((self.normalize(query), limit))
+        if future is None:
+            return False
+        try:
+            future.result()
+        except Exception:
+            return False
+        return True
+
+    def _provisional(self, key: Tuple[str, int]) -> Optional[List[Dict[str, Any]]]:
+        """Get a provisional answer to a query from the cached results of its words.
+
+        The longest cached query made of the leading whole words is used if its result
+        list was complete, i.e. shorter than the limit, filtered locally by the terms.
+        """
+        query, limit = key
+        terms = query.split()
+        for num_words in range(len(terms) - 1, 0, -1):
+            prefix_results = self._cache.get((" ".join(terms[:num_words]), limit))
+            if prefix_results is None or len(prefix_results) >= limit:
+                continue
+            results = [
+                item
+                for item in prefix_results
+                if all(term in item.get("display_name", "").casefold() for term in terms)
+            ]
+            return results or None
+        return None
+
+    def _store(self, key: Tuple[str, int], results: List[Dict[str, Any]]) -> None:
+        self._cache[key] = results
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def _fetch(self, key: Tuple[str, int], query: str) -> List[Dict[str, Any]]:
+        try:
+            with self._lock:
+                superseded = key not in self._latest.values()
+            if superseded:
+                return []
+            results = self.search(query, key[1])
+            with self._lock:
+                self._store(key, results)
+            return results
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+
+@st.cache_resource(show_spinner=False)
+def get_autocomplete() -> Autocomplete:
+    """Get the autocomplete backend shared by all sessions."""
+    return Autocomplete(search=lambda query, limit: search_nominatim(query, limit=limit))
+
+
+def autocomplete_locations(query: str, limit: int = 5) -> List[Location]:
+    """Get the locations matching a type-ahead query of the current session."""
+    if "autocomplete_client_id" not in st.session_state:
+        st.session_state.autocomplete_client_id = uuid4().hex
+    autocomplete = get_autocomplete()
+    data = autocomplete.query(query, limit, st.session_state.autocomplete_client_id)
+    if autocomplete.pending(query, limit):
+        st.session_state.autocomplete_pending = (query, limit)
+    return [new_location(item) for item in data]
+
+
+def refresh_provisional_locations() -> None:
+    """Rerun the page once the request behind provisional search results has finished.
+
+    Called at the end of a page, so the provisional results are shown in the meantime.
+    """
+    pending = st.session_state.pop("autocomplete_pending", None)
+    if pending is not None and get_autocomplete().wait(*pending):
+        st.rerun()
@@ -0,0 +1,69 @@
+import json
+from typing import Any, Callable, Optional
+import zlib
+
+from sqlalchemy import delete
+
+from schulwege.endpoints.database import get_session
+from schulwege.models.checkpoint import Checkpoint
+
+
+class Checkpoints:
+    """Intermediate results of one project run, stored per pipeline stage.
+
+    Results are stored as compressed JSON, so a retried run can skip every stage that
+    already finished.
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+
+    def get(self, stage: str) -> Optional[Any]:
+        session = get_session()
+        checkpoint = session.get(Checkpoint, (self.job_id, stage))
+        session.close()
+        if checkpoint is None:
+            return None
+        return json.loads(zlib.decompress(checkpoint.data))
+
+    def put(self, stage: str, value: Any) -> None:
+        session = get_session()
+        session.merge(
+            Checkpoint(
+                job_id=self.job_id, stage=stage, data=zlib.compress(json.dumps(value).encode())
+            )
+        )
+        session.commit()
+        session.close()
+
+    def clear(self) -> None:
+        session = get_session()
+        session.execute(delete(Checkpoint).where(Checkpoint.job_id == self.job_id))
+        session.commit()
+        session.close()
+
+
+def run_stage(
+    checkpoints: Optional[Checkpoints],
+    stage: str,
+    compute: Callable[[], Any],
+    encode: Callable[[Any], Any] = lambda value: value,
+    decode: Callable[[Any], Any] = lambda value: value,
+) -> Any:
+    """Get the result of a pipeline stage from its checkpoint or compute and store it.
+
+    Args:
+        checkpoints (Optional[Checkpoints]): The checkpoints of the run, None to always compute.
+        stage (str): The unique name of the stage within the run.
+        compute (Callable[[], Any]): Computes the result of the stage.
+        encode (Callable[[Any], Any]): Turns the result into JSON serializable data.
+        decode (Callable[[Any], Any]): Turns the stored data back into the result.
+    """
+    if checkpoints is None:
+        return compute()
+    data = checkpoints.get(stage)
+    if data is not None:
+        return decode(data)
+    value = compute()
+    checkpoints.put(stage, encode(value))
+    return value
@@ -0,0 +1,158 @@
+from typing import List, Tuple
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+
+def edges_to_csr(
+    num_nodes: int, u: np.ndarray, v: np.ndarray, lengths: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Build CSR adjacency arrays from an edge list of node positions.
+
+    Parallel edges are reduced to their shortest member.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The indptr, indices and lengths arrays.
+    """
+    order = np.lexsort((lengths, v, u))
+    u, v, lengths = u[order], v[order], lengths[order]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    u, v, lengths = u[first], v[first], lengths[first]
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(u, minlength=num_nodes), out=indptr[1:])
+    return indptr, v.astype(np.int32), lengths
+
+
+class CSRGraph:
+    """Road network stored as integer-indexed CSR arrays.
+
+    Nodes are addressed by their position in the sorted ``node_ids`` array. Edge lengths
+    are kept as one float array, parallel edges are reduced to their shortest member.
+    """
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        lengths: np.ndarray,
+    ):
+        self.node_ids = node_ids
+        self.lat = lat
+        self.lon = lon
+        self.matrix = csr_matrix((lengths, indices, indptr), shape=(len(node_ids), len(node_ids)))
+        self.graph = {"crs": "epsg:4326"}
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @classmethod
+    def from_networkx(cls, network: nx.MultiDiGraph, weight: str = "length") -> "CSRGraph":
+        """Convert a networkx road network to a CSR graph."""
+        node_ids = np.fromiter(network.nodes, dtype=np.int64, count=network.number_of_nodes())
+        node_ids.sort()
+        coords = np.array(
+            [(network.nodes[n]["y"], network.nodes[n]["x"]) for n in node_ids.tolist()]
+        )
+        num_edges = network.number_of_edges()
+        u = np.empty(num_edges, dtype=np.int64)
+        v = np.empty(num_edges, dtype=np.int64)
+        lengths = np.empty(num_edges, dtype=np.float64)
+        for i, (a, b, length) in enumerate(network.edges(data=weight, default=1)):
+            u[i], v[i], lengths[i] = a, b, length
+        u = np.searchsorted(node_ids, u)
+        v = np.searchsorted(node_ids, v)
+
+        indptr, indices, lengths = edges_to_csr(len(node_ids), u, v, lengths)
+        return cls(node_ids, coords[:, 0], coords[:, 1], indptr, indices, lengths)
+
+    def to_networkx(self) -> nx.MultiDiGraph:
+        """Convert the CSR graph to a networkx road network."""
+        graph = nx.MultiDiGraph(**self.graph)
+        graph.add_nodes_from(
+            (node_id, {"y": y, "x": x})
+            for node_id, y, x in zip(self.node_ids.tolist(), self.lat.tolist(), self.lon.tolist())
+        )
+        u = np.repeat(np.arange(len(self)), np.diff(self.matrix.indptr))
+        graph.add_edges_from(
+            (a, b, {"length": length})
+            for a, b, length in zip(
+                self.node_ids[u].tolist(),
+                self.node_ids[self.matrix.indices].tolist(),
+                self.matrix.data.tolist(),
+            )
+        )
+        return graph
+
+    def index_of(self, node_ids) -> np.ndarray:
+        """Get the positions of the given node ids."""
+        return np.searchsorted(self.node_ids, node_ids)
+
+    def shortest_path_tree(self, origin_node: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute the shortest path tree from the origin node.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Distances and predecessor positions of all nodes,
+                unreachable nodes have an infinite distance.
+        """
+        return dijkstra(
+            self.matrix, directed=True, indices=self.index_of(origin_node), return_predecessors=True
+        )
+
+    def shortest_path_forest(self, origin_nodes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Compute the shortest paths from the nearest of several origin nodes in one search.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Distances and predecessor positions
+                of all nodes and the position of the origin each node is reached from,
+                unreachable nodes have an infinite distance.
+        """
+        return dijkstra(
+            self.matrix,
+            directed=True,
+            indices=self.index_of(origin_nodes),
+            return_predecessors=True,
+            min_only=True,
+        )
+
+    def path_from_tree(self, pred: np.ndarray, dist: np.ndarray, node: int) -> List[int]:
+        """Rebuild the node positions of the path from the tree root to the given node."""
+        index = int(self.index_of(node))
+        if not np.isfinite(dist[index]):
+            return []
+        path = [index]
+        while pred[path[-1]] >= 0:
+            path.append(pred[path[-1]])
+        path.reverse()
+        return path
+
+    def accumulate_flows(
+        self, pred: np.ndarray, dist: np.ndarray, weights: np.ndarray
+    ) -> np.ndarray:
+        """Sum the weights of every subtree of a shortest path tree.
+
+        The tree is processed bottom-up in vectorized rounds: a node is handed to its
+        parent once all of its children have been handled, so each node is visited once.
+
+        Returns:
+            np.ndarray: The total weight below and including every node.
+        """
+        flow = weights.astype(np.int64)
+        has_parent = np.isfinite(dist) & (pred >= 0)
+        children = np.bincount(pred[has_parent], minlength=len(self))
+        frontier = np.flatnonzero(has_parent & (children == 0))
+        while len(frontier):
+            parents = pred[frontier]
+            np.add.at(flow, parents, flow[frontier])
+            np.subtract.at(children, parents, 1)
+            parents = np.unique(parents)
+            frontier = parents[(children[parents] == 0) & (pred[parents] >= 0)]
+        return flow
+
+    def path_coordinates(self, path: List[int]) -> List[Tuple[float, float]]:
+        """Get the (lat, lon) coordinates of a path of node positions."""
+        return list(zip(self.lat[path].tolist(), self.lon[path].tolist()))
@@ -1,6 +1,6 @@
 import os
 import streamlit as st
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 
 from schulwege.models.base import Base
@@ -27,8 +27,38 @@ def get_session():
 
 
 def init_db(engine):
+    from schulwege.models.address import ProjectAddress
+    from schulwege.models.checkpoint import Checkpoint
+    from schulwege.models.geocode import CachedGeocode
+    from schulwege.models.itinerary import CachedItinerary
+    from schulwege.models.job import Job
     from schulwege.models.project import Project
     from schulwege.models.location import Location
     from schulwege.models.segment import Segment
 
     Base.metadata.create_all(engine)
+    migrate_db(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "UPDATE projects SET segment_count = "
+                "(SELECT COUNT(*) FROM segments WHERE segments.project_id = projects.id) "
+                "WHERE segment_count IS NULL"
+            )
+        )
+        connection.execute(text("UPDATE projects SET version = 1 WHERE version IS NULL"))
+
+
+def migrate_db(engine):
+    """Add columns introduced after a table was created, ``create_all`` skips existing tables."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.tables.values():
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                )
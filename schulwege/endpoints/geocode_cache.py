@@ -0,0 +1,59 @@
+from datetime import datetime
+import json
+import re
+from typing import Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from schulwege.endpoints.database import get_session
+from schulwege.models.geocode import CachedGeocode
+
+
+def normalize_address(address: str) -> str:
+    """Normalize an address string for cache lookups.
+
+    Case, punctuation and whitespace are ignored and the common spellings of
+    "Straße" ("Str.", "Str", "Strasse") are unified.
+    """
+    address = address.casefold()
+    address = re.sub(r"[,;]", " ", address)
+    address = re.sub(r"str\.", "strasse ", address)
+    address = re.sub(r"str\b", "strasse", address)
+    return " ".join(address.split())
+
+
+def get_cached_geocodes(addresses: List[str]) -> Dict[str, dict]:
+    """Look up the cached Nominatim results of normalized addresses."""
+    session = get_session()
+    hits = {}
+    for i in range(0, len(addresses), 500):
+        for address, data in session.execute(
+            select(CachedGeocode.address, CachedGeocode.data).where(
+                CachedGeocode.address.in_(addresses[i : i + 500])
+            )
+        ):
+            hits[address] = json.loads(data)
+    session.close()
+    return hits
+
+
+def cache_geocodes(geocodes: Dict[str, dict]) -> None:
+    """Store the Nominatim results of normalized addresses in one bulk insert.
+
+    Addresses cached in the meantime, e.g. by another worker geocoding the same district
+    list, keep their entry instead of failing the insert.
+    """
+    if not geocodes:
+        return
+    session = get_session()
+    now = datetime.now()
+    session.execute(
+        insert(CachedGeocode).on_conflict_do_nothing(index_elements=["address"]),
+        [
+            {"address": address, "data": json.dumps(data), "created_at": now}
+            for address, data in geocodes.items()
+        ],
+    )
+    session.commit()
+    session.close()
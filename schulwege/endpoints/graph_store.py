@@ -0,0 +1,298 @@
+import argparse
+from datetime import datetime
+import json
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+import shapely
+from shapely import Polygon
+import streamlit as st
+
+from schulwege.endpoints.csr_routing import CSRGraph, edges_to_csr
+
+# Tag filters mirroring the OSMnx "walk" and "bike" network types.
+NETWORK_FILTERS = {
+    "walk": {
+        "highway_exclude": re.compile(
+            "abandoned|bus_guideway|construction|cycleway|motor|no|planned|platform|proposed|raceway|razed"
+        ),
+        "mode_tag": "foot",
+    },
+    "bike": {
+        "highway_exclude": re.compile(
+            "abandoned|bus_guideway|construction|corridor|elevator|escalator|footway|motor|no|planned|platform|proposed|raceway|razed|steps"
+        ),
+        "mode_tag": "bicycle",
+    },
+}
+
+STORE_ARRAYS = ("node_ids", "lat", "lon", "indptr", "indices", "lengths")
+
+
+def get_graph_store_dir() -> str:
+    """Get the graph store directory from environment variables."""
+    data_folder = os.getenv("DATA_FOLDER", "./data")
+    return os.getenv("GRAPH_STORE_DIR", os.path.join(data_folder, "graph_store"))
+
+
+def is_routable_way(tags: Dict[str, str], network_type: str) -> bool:
+    """Check whether an OSM way belongs to the given network type."""
+    network_filter = NETWORK_FILTERS[network_type]
+    highway = tags.get("highway")
+    if highway is None or network_filter["highway_exclude"].search(highway):
+        return False
+    if tags.get("area") == "yes" or tags.get("access") == "private":
+        return False
+    if tags.get("service") == "private" or tags.get(network_filter["mode_tag"]) == "no":
+        return False
+    return True
+
+
+def way_direction(tags: Dict[str, str], network_type: str) -> int:
+    """Get the travel direction of a way: 0 both ways, 1 forward only, -1 backward only."""
+    if network_type == "walk" or tags.get("oneway:bicycle") == "no":
+        return 0
+    oneway = tags.get("oneway")
+    if oneway in ("yes", "true", "1"):
+        return 1
+    if oneway == "-1":
+        return -1
+    if tags.get("junction") == "roundabout":
+        return 1
+    return 0
+
+
+def haversine_array(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+) -> np.ndarray:
+    """Vectorized haversine distance in meters."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 6371000 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def read_osm_edges(pbf_file: str, network_type: str) -> Tuple[np.ndarray, ...]:
+    """Read all directed edges of a network type from an OSM PBF file.
+
+    Returns:
+        Tuple[np.ndarray, ...]: OSM ids of edge sources and targets, and their coordinates.
+    """
+    import osmium
+
+    sources, targets, coords = [], [], {}
+    for way in (
+        osmium.FileProcessor(pbf_file)
+        .with_locations()
+        .with_filter(osmium.filter.KeyFilter("highway"))
+    ):
+        if not way.is_way():
+            continue
+        tags = dict(way.tags)
+        if not is_routable_way(tags, network_type):
+            continue
+        refs = []
+        for node in way.nodes:
+            if node.location.valid():
+                coords[node.ref] = (node.location.lat, node.location.lon)
+                refs.append(node.ref)
+        direction = way_direction(tags, network_type)
+        pairs = list(zip(refs[:-1], refs[1:]))
+        if direction >= 0:
+            sources.extend(u for u, _ in pairs)
+            targets.extend(v for _, v in pairs)
+        if direction <= 0:
+            sources.extend(v for _, v in pairs)
+            targets.extend(u for u, _ in pairs)
+
+    node_ids = np.fromiter(coords.keys(), dtype=np.int64, count=len(coords))
+    node_coords = np.array(list(coords.values()), dtype=np.float64).reshape(-1, 2)
+    return (
+        np.array(sources, dtype=np.int64),
+        np.array(targets, dtype=np.int64),
+        node_ids,
+        node_coords,
+    )
+
+
+def write_graph_store(
+    store_dir: str,
+    network_type: str,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    node_ids: np.ndarray,
+    node_coords: np.ndarray,
+    source: str,
+) -> str:
+    """Write the graph store of a network type from its directed edges.
+
+    The graph is stored as flat arrays: sorted node ids with their coordinates and the
+    CSR adjacency (indptr, indices, lengths in meters) over the node indices.
+
+    Args:
+        sources (np.ndarray): The node id every edge starts at.
+        targets (np.ndarray): The node id every edge ends at.
+        node_ids (np.ndarray): The ids of all nodes.
+        node_coords (np.ndarray): The (lat, lon) coordinates of all nodes.
+        source (str): Where the graph comes from, recorded in the store metadata.
+    Returns:
+        str: The directory of the written store.
+    """
+    order = np.argsort(node_ids)
+    node_ids, node_coords = node_ids[order], node_coords[order]
+    u = np.searchsorted(node_ids, sources).astype(np.int32)
+    v = np.searchsorted(node_ids, targets).astype(np.int32)
+    keep = u != v
+    u, v = u[keep], v[keep]
+    lengths = haversine_array(
+        node_coords[u, 0], node_coords[u, 1], node_coords[v, 0], node_coords[v, 1]
+    ).astype(np.float32)
+
+    indptr, indices, lengths = edges_to_csr(len(node_ids), u, v, lengths)
+
+    out_dir = os.path.join(store_dir, network_type)
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {
+        "node_ids": node_ids,
+        "lat": node_coords[:, 0],
+        "lon": node_coords[:, 1],
+        "indptr": indptr,
+        "indices": indices,
+        "lengths": lengths,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), array)
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(
+            {
+                "network_type": network_type,
+                "source": source,
+                "created_at": datetime.now().isoformat(),
+                "num_nodes": len(node_ids),
+                "num_edges": len(indices),
+            },
+            f,
+            indent=4,
+        )
+    return out_dir
+
+
+def build_graph_store(pbf_file: str, store_dir: str, network_type: str) -> str:
+    """Build the compact on-disk routing graph of a network type from an OSM PBF file.
+
+    Returns:
+        str: The directory of the built store.
+    """
+    sources, targets, node_ids, node_coords = read_osm_edges(pbf_file, network_type)
+    return write_graph_store(
+        store_dir,
+        network_type,
+        sources,
+        targets,
+        node_ids,
+        node_coords,
+        source=os.path.abspath(pbf_file),
+    )
+
+
+def has_graph_store(network_type: str, store_dir: Optional[str] = None) -> bool:
+    """Check whether a built graph store exists for the network type."""
+    out_dir = os.path.join(store_dir or get_graph_store_dir(), network_type)
+    return os.path.exists(os.path.join(out_dir, "meta.json"))
+
+
+@st.cache_resource(show_spinner=False)
+def load_graph_store(network_type: str, store_dir: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Memory-map the arrays of a built graph store.
+
+    The store is opened once per process; pages are only read from disk when a
+    request actually touches them.
+    """
+    out_dir = os.path.join(store_dir or get_graph_store_dir(), network_type)
+    return {
+        name: np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode="r") for name in STORE_ARRAYS
+    }
+
+
+def clip_graph_store(store: Dict[str, np.ndarray], polygon: Polygon) -> CSRGraph:
+    """Build the road network inside a polygon from a graph store.
+
+    Only edges with both endpoints inside the polygon are kept. Like OSMnx without
+    ``retain_all``, only the largest weakly connected component is returned, so no
+    location snaps to a way fragment that is cut off from the rest of the network.
+    """
+    min_lon, min_lat, max_lon, max_lat = polygon.bounds
+    lat, lon = store["lat"], store["lon"]
+    candidates = np.flatnonzero(
+        (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+    )
+    inside = np.zeros(len(lat), dtype=bool)
+    inside[candidates] = shapely.contains_xy(polygon, lon[candidates], lat[candidates])
+    nodes = np.flatnonzero(inside)
+
+    indptr = store["indptr"]
+    counts = indptr[nodes + 1] - indptr[nodes]
+    edge_positions = np.repeat(indptr[nodes] - np.cumsum(counts) + counts, counts) + np.arange(
+        counts.sum()
+    )
+    u = np.repeat(np.arange(len(nodes)), counts)
+    v = np.asarray(store["indices"][edge_positions])
+    lengths = np.asarray(store["lengths"][edge_positions], dtype=np.float64)
+    keep = inside[v]
+    positions = np.full(len(lat), -1, dtype=np.int64)
+    positions[nodes] = np.arange(len(nodes))
+    u, v, lengths = u[keep], positions[v[keep]], lengths[keep]
+
+    if len(nodes) > 0:
+        _, labels = connected_components(
+            coo_matrix((np.ones(len(u), dtype=np.int8), (u, v)), shape=(len(nodes), len(nodes))),
+            directed=True,
+            connection="weak",
+        )
+        largest = labels == np.bincount(labels).argmax()
+        keep = largest[u]
+        component_positions = np.cumsum(largest) - 1
+        nodes = nodes[largest]
+        u, v, lengths = component_positions[u[keep]], component_positions[v[keep]], lengths[keep]
+
+    clipped_indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(u, minlength=len(nodes)), out=clipped_indptr[1:])
+    return CSRGraph(
+        np.asarray(store["node_ids"][nodes]),
+        np.asarray(lat[nodes]),
+        np.asarray(lon[nodes]),
+        clipped_indptr,
+        v.astype(np.int32),
+        lengths,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline road graph store.")
+    parser.add_argument(
+        "--pbf",
+        default=os.path.join(os.getenv("OTP_DATA_DIR", "./data/opentripplanner"), "osm.pbf"),
+        help="Path to the regional OSM PBF file.",
+    )
+    parser.add_argument("--out", default=get_graph_store_dir(), help="Output directory.")
+    parser.add_argument(
+        "--network-type",
+        nargs="+",
+        default=list(NETWORK_FILTERS.keys()),
+        choices=list(NETWORK_FILTERS.keys()),
+    )
+    args = parser.parse_args()
+    for network_type in args.network_type:
+        print(f"Building {network_type} graph store from {args.pbf}...")
+        out_dir = build_graph_store(args.pbf, args.out, network_type)
+        print(f"Saved {network_type} graph store to {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import delete, or_, select, update
+import streamlit as st
+
+from schulwege.endpoints.checkpoints import Checkpoints
+from schulwege.endpoints.database import get_session
+from schulwege.endpoints.projects import create_project, update_project_addresses
+from schulwege.models.job import Job
+from schulwege.models.location import Location, location_to_dict
+
+UNFINISHED_STATUSES = ("queued", "running")
+
+# A running job whose heartbeat is older than this is considered abandoned by its worker.
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = 4 * HEARTBEAT_INTERVAL
+
+# Warnings raised through st.warning while a job runs in a worker process.
+_job_messages: List[str] = []
+
+
+def get_job_workers() -> int:
+    """Get the maximum number of projects computed at the same time."""
+    return int(os.getenv("JOB_WORKERS", "2"))
+
+
+def _record_warning(body, *args, **kwargs):
+    _job_messages.append(str(body))
+
+
+def init_job_worker():
+    """Prepare a worker process.
+
+    A worker has no page to render to, so warnings are collected and stored on the job
+    instead of being lost.
+    """
+    st.warning = _record_warning
+
+
+def get_worker_id() -> str:
+    """Get the identifier of the current worker process, stored as the owner of its jobs."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(job_id: int, owner: str) -> bool:
+    """Mark a queued job as running for the given owner.
+
+    The status is changed in a single conditional update, so of several workers that
+    try to run the same job, e.g. a batch run and the web process, only one succeeds.
+
+    Returns:
+        bool: Whether the job was claimed.
+    """
+    now = datetime.now()
+    session = get_session()
+    result = session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(
+            status="running",
+            owner=owner,
+            started_at=now,
+            heartbeat_at=now,
+            progress="Gestartet",
+        )
+    )
+    session.commit()
+    session.close()
+    return result.rowcount == 1
+
+
+def beat_job(job_id: int, owner: str, stop: threading.Event, interval: float) -> None:
+    """Renew the heartbeat of a running job every ``interval`` seconds until stopped."""
+    while not stop.wait(interval):
+        session = get_session()
+        session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.owner == owner)
+            .values(heartbeat_at=datetime.now())
+        )
+        session.commit()
+        session.close()
+
+
+def requeue_stale_jobs(stale_after: float = STALE_AFTER) -> None:
+    """Queue running jobs again whose worker stopped renewing their heartbeat."""
+    session = get_session()
+    session.execute(
+        update(Job)
+        .where(
+            Job.status == "running",
+            or_(
+                Job.heartbeat_at.is_(None),
+                Job.heartbeat_at < datetime.now() - timedelta(seconds=stale_after),
+            ),
+        )
+        .values(status="queued", owner=None, progress="In der Warteschlange")
+    )
+    session.commit()
+    session.close()
+
+
+def update_job(job_id: int, **values) -> None:
+    session = get_session()
+    job = session.get(Job, job_id)
+    for key, value in values.items():
+        setattr(job, key, value)
+    if _job_messages:
+        job.messages = json.dumps(_job_messages)
+    session.commit()
+    session.close()
+
+
+def run_project_job(
+    job_id: int, progress_interval: float = 0.5, heartbeat_interval: float = HEARTBEAT_INTERVAL
+) -> Optional[int]:
+    """Create or update the project of a job inside a worker process.
+
+    The job is claimed first and skipped if it is not queued anymore, e.g. because
+    another worker runs it. While it runs, its heartbeat is renewed in the background,
+    so a new web process only queues it again once its worker is gone.
+
+    Progress messages are written to the job at most every ``progress_interval``
+    seconds, so the web process can poll them without the job waiting on the database.
+    Finished stages are checkpointed, a failed job continues from them when it is
+    retried. The checkpoints are removed once the job is done.
+
+    Returns:
+        Optional[int]: The id of the created or updated project, None if the job failed
+            or was not claimed.
+    """
+    if not claim_job(job_id, get_worker_id()):
+        return None
+    _job_messages.clear()
+    session = get_session()
+    payload = json.loads(session.get(Job, job_id).payload)
+    session.close()
+    stop_heartbeat = threading.Event()
+    threading.Thread(
+        target=beat_job,
+        args=(job_id, get_worker_id(), stop_heartbeat, heartbeat_interval),
+        daemon=True,
+    ).start()
+    try:
+        return _run_claimed_job(job_id, payload, progress_interval)
+    finally:
+        stop_heartbeat.set()
+
+
+def _run_claimed_job(job_id: int, payload: dict, progress_interval: float) -> Optional[int]:
+    """Run a job the current worker has claimed and store its result."""
+    checkpoints = Checkpoints(job_id)
+    last_update = 0.0
+
+    def progress_callback(progress: str):
+        nonlocal last_update
+        now = time.monotonic()
+        if now - last_update >= progress_interval:
+            last_update = now
+            update_job(job_id, progress=progress)
+
+    try:
+        if "project_id" in payload:
+            project = update_project_addresses(
+                payload["project_id"],
+                payload["address_list"],
+                progress_callback=progress_callback,
+                force=payload["force"],
+                checkpoints=checkpoints,
+            )
+        else:
+            project = create_project(
+                Location(**payload["main_location"]),
+                payload["project_name"],
+                payload["address_list"],
+                progress_callback=progress_callback,
+                force=payload["force"],
+                checkpoints=checkpoints,
+            )
+    except Exception as e:
+        _job_messages.append(f"{type(e).__name__}: {e}")
+        update_job(job_id, status="failed", finished_at=datetime.now())
+        return None
+    if project is None:
+        update_job(job_id, status="failed", finished_at=datetime.now())
+        return None
+    checkpoints.clear()
+    update_job(
+        job_id,
+        status="done",
+        project_id=project.id,
+        progress="Fertig!",
+        finished_at=datetime.now(),
+    )
+    return project.id
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_executor() -> ProcessPoolExecutor:
+    """Get the worker pool shared by all sessions of the web process.
+
+    The pool is created when the app starts (see ``app.py``) and again after a worker
+    died. At most ``JOB_WORKERS`` jobs run at the same time, further jobs wait in the
+    queue. Queued jobs and running jobs whose worker is gone are submitted again; jobs
+    that another live process runs are left alone.
+    """
+    executor = ProcessPoolExecutor(
+        max_workers=get_job_workers(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_job_worker,
+    )
+    requeue_stale_jobs()
+    session = get_session()
+    queued = session.scalars(select(Job.id).where(Job.status == "queued").order_by(Job.id)).all()
+    session.close()
+    for job_id in queued:
+        _submit(executor, job_id)
+    return executor
+
+
+def _submit(executor: ProcessPoolExecutor, job_id: int) -> None:
+    future = executor.submit(run_project_job, job_id)
+    future.add_done_callback(lambda future: handle_broken_pool(job_id, future))
+
+
+def handle_broken_pool(job_id: int, future: Future) -> None:
+    """Fail the job of a worker that died and drop the broken pool.
+
+    A pool is unusable once one of its workers died, e.g. out of memory on a large
+    graph. The job that was running is marked as failed, so it can be retried by hand
+    instead of crashing the next pool as well. Jobs that were still queued stay queued
+    and are submitted by the pool created on the next access.
+    """
+    if future.cancelled() or not isinstance(future.exception(), BrokenProcessPool):
+        return
+    get_job_executor.clear()
+    session = get_session()
+    session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "running")
+        .values(
+            status="failed",
+            finished_at=datetime.now(),
+            messages=json.dumps(
+                [
+                    "Der Auftrag wurde abgebrochen, weil sein Prozess unerwartet beendet "
+                    "wurde, z. B. wegen zu wenig Arbeitsspeicher."
+                ]
+            ),
+        )
+    )
+    session.commit()
+    session.close()
+
+
+def submit_job(job_id: int) -> None:
+    """Submit a queued job to the worker pool, replacing the pool if it is broken."""
+    try:
+        _submit(get_job_executor(), job_id)
+    except BrokenProcessPool:
+        get_job_executor.clear()
+        # the new pool submits all queued jobs, this one included
+        get_job_executor()
+
+
+def add_job(payload: dict) -> int:
+    """Store a queued job with the given payload and get its id."""
+    session = get_session()
+    job = Job(payload=json.dumps(payload), progress="In der Warteschlange")
+    session.add(job)
+    session.commit()
+    job_id = job.id
+    session.close()
+    return job_id
+
+
+def queue_job(payload: dict) -> int:
+    """Store a job with the given payload, submit it and get its id."""
+    # create the pool first, so its startup does not submit the new job a second time
+    get_job_executor()
+    job_id = add_job(payload)
+    submit_job(job_id)
+    return job_id
+
+
+def project_job_payload(
+    main_location: Location, project_name: Optional[str], address_list: List[str], force: bool
+) -> dict:
+    """Get the payload of a job that creates a project."""
+    return {
+        "main_location": location_to_dict(main_location),
+        "project_name": project_name,
+        "address_list": address_list,
+        "force": force,
+    }
+
+
+def submit_project_job(
+    main_location: Location, project_name: Optional[str], address_list: List[str], force: bool
+) -> int:
+    """Queue the creation of a project and get the id of its job."""
+    return queue_job(project_job_payload(main_location, project_name, address_list, force))
+
+
+def submit_update_job(project_id: int, address_list: List[str], force: bool) -> int:
+    """Queue an update of the address list of a project and get the id of its job."""
+    return queue_job({"project_id": project_id, "address_list": address_list, "force": force})
+
+
+def requeue_failed_job(job_id: int, force: Optional[bool] = None) -> bool:
+    """Queue a failed job again.
+
+    The job is only changed while it is still failed, so retrying it twice queues it
+    once.
+
+    Args:
+        job_id (int): The id of the failed job.
+        force (Optional[bool]): Whether to ignore addresses that could not be found,
+            None to keep the setting of the job.
+    Returns:
+        bool: Whether the job was queued.
+    """
+    session = get_session()
+    job = session.get(Job, job_id)
+    if job is None:
+        session.close()
+        return False
+    payload = json.loads(job.payload)
+    if force is not None:
+        payload["force"] = force
+    result = session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "failed")
+        .values(
+            status="queued",
+            payload=json.dumps(payload),
+            progress="In der Warteschlange",
+            messages=None,
+            owner=None,
+            started_at=None,
+            finished_at=None,
+        )
+    )
+    session.commit()
+    session.close()
+    return result.rowcount == 1
+
+
+def retry_job(job_id: int, force: Optional[bool] = None) -> None:
+    """Queue a failed job again, it continues from its last finished stage."""
+    get_job_executor()
+    if requeue_failed_job(job_id, force):
+        submit_job(job_id)
+
+
+def discard_job(job_id: int) -> None:
+    """Remove a job together with its checkpoints."""
+    Checkpoints(job_id).clear()
+    session = get_session()
+    session.execute(delete(Job).where(Job.id == job_id))
+    session.commit()
+    session.close()
+
+
+def get_job(job_id: int) -> Optional[Job]:
+    session = get_session()
+    job = session.get(Job, job_id)
+    session.close()
+    return job
+
+
+def get_unfinished_jobs() -> List[Job]:
+    session = get_session()
+    jobs = session.scalars(
+        select(Job).where(Job.status.in_(UNFINISHED_STATUSES)).order_by(Job.id)
+    ).all()
+    session.close()
+    return jobs
+
+
+def get_failed_jobs() -> List[Job]:
+    session = get_session()
+    jobs = session.scalars(select(Job).where(Job.status == "failed").order_by(Job.id)).all()
+    session.close()
+    return jobs
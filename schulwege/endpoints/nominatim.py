@@ -1,9 +1,28 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from schulwege.endpoints.geocode_cache import cache_geocodes, get_cached_geocodes, normalize_address
 from schulwege.models.location import Location, new_location
 
 
+class GeocodingError(Exception):
+    """Raised when Nominatim requests of a batch failed after their retries."""
+
+    def __init__(self, errors: Dict[str, str]):
+        self.errors = errors
+        super().__init__(
+            f"{len(errors)} addresses could not be geocoded, the results of the other "
+            "addresses are cached:\n- "
+            + "\n- ".join(f"{query}: {error}" for query, error in errors.items())
+        )
+
+
 def get_nominatim_url() -> str:
     """Get the Nominatim API URL from environment variables."""
     NOMINATIM_HOST = "localhost"
@@ -11,10 +30,30 @@ def get_nominatim_url() -> str:
     return f"http://{NOMINATIM_HOST}:{NOMINATIM_PORT}"
 
 
-def get_locations(query: str, limit: int = 10) -> List[Location]:
-    """Get location data from Nominatim API."""
-    import requests
+def get_nominatim_max_workers() -> int:
+    """Get the maximum number of concurrent Nominatim requests."""
+    return int(os.getenv("NOMINATIM_MAX_WORKERS", "8"))
 
+
+def new_nominatim_session(pool_size: int, retries: int = 3, backoff_factor: float = 0.5):
+    """Create a pooled HTTP session for Nominatim with retries on transient failures."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def search_nominatim(
+    query: str, limit: int = 10, session: Optional[requests.Session] = None
+) -> List[Dict[str, Any]]:
+    """Get the raw search results from Nominatim API."""
     url = f"{get_nominatim_url()}/search"
     params = {
         "q": query,
@@ -23,23 +62,81 @@ def get_locations(query: str, limit: int = 10) -> List[Location]:
         "extratags": 1,
         "limit": limit,
     }
-    response = requests.get(url, params=params)
+    response = (session or requests).get(url, params=params, timeout=30)
     response.raise_for_status()
-    data = response.json()
-    if not data:
-        return []
+    return response.json() or []
+
+
+def get_locations(
+    query: str, limit: int = 10, session: Optional[requests.Session] = None
+) -> List[Location]:
+    """Get location data from Nominatim API."""
+    data = search_nominatim(query, limit=limit, session=session)
     return [new_location(item) for item in data]
 
 
-def get_top_location_batch(queries: List[str], progress_callback=None) -> List[Location]:
-    """Get the top location for each query in the list."""
-    results = []
-    for i, query in enumerate(queries):
-        if progress_callback:
-            progress_callback(i, query)
-        locations = get_locations(query, limit=1)
-        if locations:
-            results.append(locations[0])
-        else:
-            results.append(None)
-    return results
+def get_top_location_batch(
+    queries: List[str],
+    progress_callback=None,
+    max_workers: Optional[int] = None,
+    use_cache: bool = True,
+) -> List[Location]:
+    """Get the top location for each query in the list.
+
+    Queries are deduplicated by their normalized address and looked up in the geocode
+    cache first. Only the remaining addresses are sent to Nominatim, concurrently on a
+    thread pool sharing one pooled session, and their results are written back to the
+    cache. The results keep the order of the queries, with None for queries without a
+    match. A failing request does not abort the others; the fetched results are cached
+    before the failures are raised, so a retry only sends the failed queries again.
+
+    Args:
+        progress_callback: Called with the number of finished queries, the last finished
+            query, the throughput in requests per second and the remaining seconds.
+    Raises:
+        GeocodingError: If requests failed after their retries, with the error of every
+            failed query.
+    """
+    max_workers = max_workers or get_nominatim_max_workers()
+    addresses = [normalize_address(query) for query in queries]
+    multiplicity = Counter(addresses)
+    found = get_cached_geocodes(list(multiplicity)) if use_cache else {}
+    pending = {
+        address: query
+        for address, query in zip(addresses, queries)
+        if address not in found and address.strip()
+    }
+
+    done = sum(multiplicity[address] for address in found)
+    if progress_callback and done:
+        progress_callback(done, "aus dem Zwischenspeicher", 0, 0)
+    fetched = {}
+    errors = {}
+    start = time.perf_counter()
+    with new_nominatim_session(pool_size=max_workers) as session:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(search_nominatim, query, limit=1, session=session): address
+                for address, query in pending.items()
+            }
+            for requests_done, future in enumerate(as_completed(futures), start=1):
+                address = futures[future]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    errors[pending[address]] = str(e)
+                    data = []
+                if data:
+                    fetched[address] = data[0]
+                done += multiplicity[address]
+                if progress_callback:
+                    rate = requests_done / (time.perf_counter() - start)
+                    eta = (len(futures) - requests_done) / rate
+                    progress_callback(done, pending[address], rate, eta)
+
+    if use_cache:
+        cache_geocodes(fetched)
+    if errors:
+        raise GeocodingError(errors)
+    found.update(fetched)
+    return [new_location(found[address]) if address in found else None for address in addresses]
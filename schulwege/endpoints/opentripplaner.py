@@ -1,7 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import os
+from typing import Dict, List, Optional, Tuple
 import polyline
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from schulwege.endpoints.otp_cache import (
+    cache_itineraries,
+    get_cached_itineraries,
+    get_gtfs_version,
+    itinerary_cache_key,
+)
 from schulwege.models.location import Location
 
 
@@ -12,6 +22,31 @@ def get_open_trip_planner_url() -> str:
     return f"http://{OTP_HOST}:{OTP_PORT}/otp/gtfs/v1"
 
 
+def get_otp_max_workers() -> int:
+    """Get the maximum number of concurrent OpenTripPlanner requests."""
+    return int(os.getenv("OTP_MAX_WORKERS", "8"))
+
+
+def new_otp_session(pool_size: int, retries: int = 3, backoff_factor: float = 0.5):
+    """Create a pooled HTTP session for OpenTripPlanner.
+
+    Connections are kept alive across requests, transient failures (connection errors,
+    429 and 5xx responses) are retried with exponential backoff.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["POST"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def get_public_transport_route(
     origin: Location,
     destination: Location,
@@ -19,6 +54,8 @@ def get_public_transport_route(
     time: str,
     transport_modes: list,
     return_points_of: list = None,
+    session: Optional[requests.Session] = None,
+    timeout: float = 60,
 ):
 
     from_lat = origin.lat
@@ -58,7 +95,9 @@ def get_public_transport_route(
     }
     url = get_open_trip_planner_url()
 
-    response = requests.post(url, json={"query": query}, headers=headers)
+    response = (session or requests).post(
+        url, json={"query": query}, headers=headers, timeout=timeout
+    )
 
     if response.status_code == 200:
         data = response.json()
@@ -84,3 +123,100 @@ def get_public_transport_route(
         return route, modality_desc
     else:
         raise Exception(f"Query failed with status code {response.status_code}: {response.text}")
+
+
+def get_public_transport_routes(
+    origin: Location,
+    destinations: List[Location],
+    date: str,
+    time: str,
+    transport_modes: list,
+    return_points_of: list = None,
+    max_workers: Optional[int] = None,
+    progress_callback=None,
+    use_cache: bool = True,
+    cache_batch_size: int = 100,
+) -> Tuple[List[Tuple[list, list]], Dict[int, str]]:
+    """Query the public transport routes to all destinations concurrently.
+
+    Routes found in the itinerary cache are not queried again. The remaining requests
+    share one pooled session and run on a thread pool of at most ``max_workers``
+    threads. A failing destination does not abort the others.
+
+    Args:
+        progress_callback: Called with the number of finished and total destinations.
+        use_cache: Whether to read and fill the persistent itinerary cache.
+        cache_batch_size: Number of finished routes written to the cache at once, so an
+            interrupted run keeps the routes it already queried.
+    Returns:
+        Tuple[List[Tuple[list, list]], Dict[int, str]]: The (route, modalities) of each
+            destination in input order, empty for failed destinations, and the error
+            message of every failed destination by its index.
+    """
+    max_workers = max_workers or get_otp_max_workers()
+    results = [([], [])] * len(destinations)
+    errors = {}
+    if not destinations:
+        return results, errors
+
+    cached = {}
+    if use_cache:
+        gtfs_version = get_gtfs_version()
+        keys = [
+            itinerary_cache_key(
+                origin, destination, date, time, transport_modes, return_points_of, gtfs_version
+            )
+            for destination in destinations
+        ]
+        cached = get_cached_itineraries(keys, gtfs_version)
+    pending = []
+    for i, destination in enumerate(destinations):
+        if use_cache and keys[i] in cached:
+            route, modalities = cached[keys[i]]
+            if route:
+                # the key is rounded, so the exact destination replaces the cached end point
+                route = route[:-1] + [(destination.lat, destination.lon)]
+            results[i] = (route, modalities)
+        else:
+            pending.append(i)
+    if progress_callback and len(pending) < len(destinations):
+        progress_callback(len(destinations) - len(pending), len(destinations))
+
+    finished = []
+
+    def flush_cache():
+        if use_cache and finished:
+            cache_itineraries({keys[i]: results[i] for i in finished}, gtfs_version)
+        finished.clear()
+
+    with new_otp_session(pool_size=max_workers) as session:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    get_public_transport_route,
+                    origin=origin,
+                    destination=destinations[i],
+                    date=date,
+                    time=time,
+                    transport_modes=transport_modes,
+                    return_points_of=return_points_of,
+                    session=session,
+                ): i
+                for i in pending
+            }
+            for done, future in enumerate(as_completed(futures)):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                    finished.append(i)
+                except Exception as e:
+                    errors[i] = str(e)
+                if len(finished) >= cache_batch_size:
+                    flush_cache()
+                if progress_callback:
+                    progress_callback(
+                        len(destinations) - len(pending) + done + 1, len(destinations)
+                    )
+
+    flush_cache()
+    return results, errors
@@ -0,0 +1,174 @@
+from datetime import datetime
+from functools import lru_cache
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import polyline
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from schulwege.endpoints.database import get_session
+from schulwege.models.itinerary import CachedItinerary
+from schulwege.models.location import Location
+
+
+def get_gtfs_file() -> str:
+    """Get the path of the GTFS feed loaded by OpenTripPlanner."""
+    return os.path.join(os.getenv("OTP_DATA_DIR", "./data/opentripplanner"), "gtfs.zip")
+
+
+def get_otp_cache_max_bytes() -> int:
+    """Get the maximum size of the itinerary cache in bytes."""
+    return int(os.getenv("OTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+@lru_cache(maxsize=4)
+def _hash_file(path: str, size: int, mtime: float) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def get_gtfs_version() -> str:
+    """Get a hash of the current GTFS feed, recomputed only when the file changes."""
+    path = get_gtfs_file()
+    if not os.path.exists(path):
+        return "none"
+    stat = os.stat(path)
+    return _hash_file(path, stat.st_size, stat.st_mtime)
+
+
+def itinerary_cache_key(
+    origin: Location,
+    destination: Location,
+    date: str,
+    time: str,
+    transport_modes: list,
+    return_points_of: Optional[list],
+    gtfs_version: str,
+    precision: int = 4,
+    slot_minutes: int = 15,
+) -> str:
+    """Build the cache key of an itinerary query.
+
+    Coordinates are rounded to ``precision`` decimals (about 10 m for 4) and the departure
+    is reduced to its weekday and ``slot_minutes`` time slot, so reruns in a later week
+    hit the same entries as long as the GTFS feed is unchanged.
+    """
+    hour, minute = map(int, time.split(":")[:2])
+    slot = (hour * 60 + minute) // slot_minutes
+    weekday = datetime.strptime(date, "%Y-%m-%d").weekday()
+    parts = [
+        round(origin.lat, precision),
+        round(origin.lon, precision),
+        round(destination.lat, precision),
+        round(destination.lon, precision),
+        weekday,
+        slot,
+        sorted(transport_modes),
+        sorted(return_points_of) if return_points_of is not None else None,
+        gtfs_version,
+    ]
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+
+def encode_itinerary(route: list, modalities: list) -> Tuple[str, str]:
+    """Encode a route as polyline and its modalities run-length encoded."""
+    runs = []
+    for modality in modalities:
+        if runs and runs[-1][0] == modality:
+            runs[-1][1] += 1
+        else:
+            runs.append([modality, 1])
+    return polyline.encode(route, precision=6), json.dumps(runs)
+
+
+def decode_itinerary(route: str, modalities: str) -> Tuple[list, list]:
+    """Decode a route and its modalities encoded by ``encode_itinerary``."""
+    return (
+        polyline.decode(route, precision=6),
+        [modality for modality, n in json.loads(modalities) for _ in range(n)],
+    )
+
+
+def get_cached_itineraries(keys: List[str], gtfs_version: str) -> Dict[str, Tuple[list, list]]:
+    """Look up cached itineraries.
+
+    Entries built from another GTFS feed are invalidated first. Hits are marked as
+    recently used for the eviction policy.
+    """
+    session = get_session()
+    session.execute(delete(CachedItinerary).where(CachedItinerary.gtfs_version != gtfs_version))
+    entries = []
+    for i in range(0, len(keys), 500):
+        entries.extend(
+            session.scalars(
+                select(CachedItinerary).where(CachedItinerary.key.in_(keys[i : i + 500]))
+            )
+        )
+    now = datetime.now()
+    for entry in entries:
+        entry.last_used_at = now
+    session.commit()
+    hits = {entry.key: decode_itinerary(entry.route, entry.modalities) for entry in entries}
+    session.close()
+    return hits
+
+
+def cache_itineraries(itineraries: Dict[str, Tuple[list, list]], gtfs_version: str) -> None:
+    """Store itineraries in the cache and evict the least recently used entries
+    once the cache exceeds its size limit.
+
+    Entries are upserted in one statement, so an itinerary another worker cached in the
+    meantime is replaced instead of failing the insert.
+    """
+    if not itineraries:
+        return
+    session = get_session()
+    now = datetime.now()
+    rows = []
+    for key, (route, modalities) in itineraries.items():
+        encoded_route, encoded_modalities = encode_itinerary(route, modalities)
+        rows.append(
+            {
+                "key": key,
+                "gtfs_version": gtfs_version,
+                "route": encoded_route,
+                "modalities": encoded_modalities,
+                "size": len(key) + len(encoded_route) + len(encoded_modalities),
+                "last_used_at": now,
+            }
+        )
+    statement = insert(CachedItinerary)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["key"],
+            set_={
+                column: statement.excluded[column]
+                for column in ("gtfs_version", "route", "modalities", "size", "last_used_at")
+            },
+        ),
+        rows,
+    )
+
+    total_size = session.scalar(select(func.sum(CachedItinerary.size))) or 0
+    excess = total_size - get_otp_cache_max_bytes()
+    if excess > 0:
+        evicted = []
+        for key, size in session.execute(
+            select(CachedItinerary.key, CachedItinerary.size).order_by(CachedItinerary.last_used_at)
+        ):
+            if excess <= 0:
+                break
+            evicted.append(key)
+            excess -= size
+        for i in range(0, len(evicted), 500):
+            session.execute(
+                delete(CachedItinerary).where(CachedItinerary.key.in_(evicted[i : i + 500]))
+            )
+    session.commit()
+    session.close()
@@ -0,0 +1,401 @@
+from collections import Counter
+import json
+from typing import Dict, List, Optional, Tuple
+import zlib
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+import streamlit as st
+
+from schulwege.endpoints.checkpoints import Checkpoints, run_stage
+from schulwege.endpoints.database import get_session
+from schulwege.endpoints.nominatim import get_top_location_batch
+from schulwege.endpoints.routing import compute_segments, load_model_config
+from schulwege.endpoints.segments import (
+    SEGMENT_COLUMNS,
+    insert_segments,
+    segment_key,
+    segment_to_row,
+)
+from schulwege.endpoints.vector_tiles import build_project_tiles
+from schulwege.models.address import ProjectAddress
+from schulwege.models.location import Location, location_to_dict
+from schulwege.models.project import Project
+from schulwege.models.segment import Segment
+
+
+def geocode_addresses(
+    address_list: List[str],
+    progress_callback=None,
+    force: bool = False,
+    checkpoints: Optional[Checkpoints] = None,
+) -> Optional[Tuple[List[int], List[Location]]]:
+    """Geocode the addresses and drop the ones that could not be found.
+
+    Returns:
+        Optional[Tuple[List[int], List[Location]]]: The indices of the found addresses
+            and their locations, None if addresses could not be found and ``force`` is
+            not set.
+    """
+    locations = run_stage(
+        checkpoints,
+        "geocoding",
+        lambda: get_top_location_batch(
+            address_list,
+            progress_callback=lambda done, query, rate, eta: (
+                progress_callback(
+                    f"Geokodierung: {done}/{len(address_list)} "
+                    f"({rate:.1f}/s, noch ca. {eta:.0f} s): {query}"
+                )
+                if progress_callback
+                else None
+            ),
+        ),
+        encode=lambda locations: [
+            location_to_dict(loc) if loc is not None else None for loc in locations
+        ],
+        decode=lambda data: [Location(**loc) if loc is not None else None for loc in data],
+    )
+    num_errors = sum(1 for loc in locations if loc is None)
+    error_locations = [address_list[i] for i, loc in enumerate(locations) if loc is None]
+    if num_errors > 0 and not force:
+        st.warning(
+            f"{num_errors} von {len(address_list)} Adressen konnten nicht gefunden werden. Korrigieren Sie die Adressen oder setzen Sie den Haken 'Fehlerhafte Adressen ignorieren' und probieren Sie es erneut.\n- "
+            + "\n- ".join(error_locations)
+        )
+        return None
+    found = [i for i, loc in enumerate(locations) if loc is not None]
+    return found, [locations[i] for i in found]
+
+
+def encode_address_routes(routes: Dict[str, List[List[Tuple[float, float]]]]) -> bytes:
+    return zlib.compress(json.dumps(routes).encode())
+
+
+def decode_address_routes(data: Optional[bytes]) -> Dict[str, List[List[Tuple[float, float]]]]:
+    if data is None:
+        return {}
+    return {
+        cfg_key: [[tuple(point) for point in route] for route in routes]
+        for cfg_key, routes in json.loads(zlib.decompress(data)).items()
+    }
+
+
+def insert_project_addresses(
+    session: Session,
+    project_id: int,
+    addresses: List[str],
+    locations: List[Location],
+    service_routes: List[Dict[str, List[List[Tuple[float, float]]]]],
+) -> None:
+    """Insert the addresses of a project with their locations and service routes."""
+    if not addresses:
+        return
+    session.execute(
+        ProjectAddress.__table__.insert(),
+        [
+            {
+                "project_id": project_id,
+                "address": address,
+                "lat": location.lat,
+                "lon": location.lon,
+                "routes": encode_address_routes(routes),
+            }
+            for address, location, routes in zip(addresses, locations, service_routes)
+        ],
+    )
+
+
+def build_tiles(project_id: int, segments: List[Segment], progress_callback=None) -> None:
+    """Build the vector tiles of a project if they are enabled in the model config."""
+    tile_config = load_model_config().get("vector_tiles", {})
+    if tile_config.get("enabled", False):
+        build_project_tiles(
+            project_id,
+            segments,
+            min_zoom=tile_config.get("min_zoom", 11),
+            max_zoom=tile_config.get("max_zoom", 16),
+            progress_callback=progress_callback,
+        )
+
+
+def save_project(
+    main_location: Optional[Location],
+    project_name: Optional[str],
+    segments: List[Segment],
+    addresses: List[str],
+    locations: List[Location],
+    service_routes: List[Dict[str, List[List[Tuple[float, float]]]]],
+    progress_callback=None,
+) -> int:
+    """Store a new project with its segments and addresses and get its id.
+
+    Projects without a main location, e.g. combined layers of several schools, need a
+    project name.
+    """
+    if progress_callback:
+        progress_callback(f"Speichere {len(segments)} Segmente...")
+    session = get_session()
+    if main_location is not None:
+        session.add(main_location)
+    project = Project(
+        name=project_name or main_location.to_string(),
+        main_location=main_location,
+        segment_count=len(segments),
+    )
+    session.add(project)
+    session.flush()
+    rows_per_second = insert_segments(session, project.id, segments)
+    insert_project_addresses(session, project.id, addresses, locations, service_routes)
+    session.commit()
+    project_id = project.id
+    session.close()
+    if progress_callback:
+        progress_callback(f"{len(segments)} Segmente gespeichert ({rows_per_second:.0f} Zeilen/s)")
+    return project_id
+
+
+def create_project(
+    main_location: Location,
+    project_name: Optional[str],
+    address_list: List[str],
+    progress_callback=None,
+    force: bool = False,
+    checkpoints: Optional[Checkpoints] = None,
+) -> Optional[Project]:
+    """Geocode the addresses, compute the segments and store them as a new project.
+
+    The location and the service routes (see ``compute_school_routes``) of every
+    address are stored with the address, so the address list can be updated later
+    without geocoding and routing the unchanged addresses again. With ``checkpoints``, the geocoding and routing results are stored per stage,
+    so a retried run continues after the last finished stage.
+    """
+
+    geocoded = geocode_addresses(address_list, progress_callback, force, checkpoints)
+    if geocoded is None:
+        return None
+    found, locations = geocoded
+    addresses = [address_list[i] for i in found]
+
+    segments, service_routes = compute_segments(
+        main_location,
+        locations,
+        progress_callback=lambda p: (
+            progress_callback(f"Berechnung der Schulwege: {p}") if progress_callback else None
+        ),
+        checkpoints=checkpoints,
+    )
+
+    project_id = run_stage(
+        checkpoints,
+        "project",
+        lambda: save_project(
+            main_location,
+            project_name,
+            segments,
+            addresses,
+            locations,
+            service_routes,
+            progress_callback,
+        ),
+    )
+    session = get_session()
+    project = session.get(Project, project_id)
+    session.close()
+
+    build_tiles(project.id, segments, progress_callback)
+    st.success(f"Projekt '{project.name}' wurde erfolgreich erstellt!")
+    if progress_callback:
+        progress_callback("Fertig!")
+    return project
+
+
+def diff_addresses(
+    stored: List[Tuple[int, str]], address_list: List[str]
+) -> Tuple[List[str], List[int]]:
+    """Compare a new address list with the stored addresses of a project.
+
+    Addresses may occur several times, e.g. for siblings, so they are matched one by one.
+
+    Args:
+        stored (List[Tuple[int, str]]): The id and address of every stored address.
+        address_list (List[str]): The new address list.
+    Returns:
+        Tuple[List[str], List[int]]: The added addresses and the ids of the removed ones.
+    """
+    unmatched = Counter(address for _, address in stored)
+    added = []
+    for address in address_list:
+        if unmatched[address] > 0:
+            unmatched[address] -= 1
+        else:
+            added.append(address)
+    removed_ids = []
+    for address_id, address in stored:
+        if unmatched[address] > 0:
+            unmatched[address] -= 1
+            removed_ids.append(address_id)
+    return added, removed_ids
+
+
+def apply_address_update(
+    project_id: int,
+    segments: List[Segment],
+    addresses: List[str],
+    locations: List[Location],
+    service_routes: List[Dict[str, List[List[Tuple[float, float]]]]],
+    removed_ids: List[int],
+    refreshed_routes: Dict[int, Dict[str, List[List[Tuple[float, float]]]]],
+    progress_callback=None,
+) -> int:
+    """Store the recomputed segments and the changed addresses of a project.
+
+    The segments are matched with the stored ones by their key. Changed frequencies are
+    updated in place, new segments are inserted and segments that are no longer used
+    often enough are deleted. The removed addresses are deleted, the added ones inserted
+    and the kept ones whose service routes were routed again get their new routes.
+
+    Returns:
+        int: The id of the project.
+    """
+    if progress_callback:
+        progress_callback("Aktualisiere Segmente...")
+    session = get_session()
+    columns = [getattr(Segment, column) for column in SEGMENT_COLUMNS]
+    stored = {
+        segment_key(row[1:]): (row.id, row.frequency)
+        for row in session.execute(
+            select(Segment.id, *columns).where(Segment.project_id == project_id)
+        )
+    }
+    updated, inserted = [], []
+    for segment in segments:
+        key = segment_key(segment_to_row(segment))
+        if key not in stored:
+            inserted.append(segment)
+            continue
+        segment_id, frequency = stored.pop(key)
+        if frequency != segment.frequency:
+            updated.append({"id": segment_id, "frequency": segment.frequency})
+    deleted_ids = [segment_id for segment_id, _ in stored.values()]
+
+    if updated:
+        session.execute(update(Segment), updated)
+    if deleted_ids:
+        session.execute(delete(Segment).where(Segment.id.in_(deleted_ids)))
+    insert_segments(session, project_id, inserted)
+    if removed_ids:
+        session.execute(delete(ProjectAddress).where(ProjectAddress.id.in_(removed_ids)))
+    if refreshed_routes:
+        session.execute(
+            update(ProjectAddress),
+            [
+                {"id": address_id, "routes": encode_address_routes(routes)}
+                for address_id, routes in refreshed_routes.items()
+            ],
+        )
+    insert_project_addresses(session, project_id, addresses, locations, service_routes)
+
+    project = session.get(Project, project_id)
+    project.segment_count = len(segments)
+    project.version = (project.version or 1) + 1
+    session.commit()
+    session.close()
+    if progress_callback:
+        progress_callback(
+            f"{len(updated)} Segmente aktualisiert, {len(inserted)} hinzugefügt, "
+            f"{len(deleted_ids)} entfernt"
+        )
+    return project_id
+
+
+def update_project_addresses(
+    project_id: int,
+    address_list: List[str],
+    progress_callback=None,
+    force: bool = False,
+    checkpoints: Optional[Checkpoints] = None,
+) -> Optional[Project]:
+    """Replace the address list of a project without geocoding the unchanged addresses.
+
+    The new list is compared with the stored addresses and only the added addresses are
+    geocoded. The segments are recomputed for all addresses with the vectorized tree
+    accumulation, the unchanged addresses reuse their stored locations and service
+    routes, so they cause no requests to Nominatim or OpenTripPlanner. The stored
+    segments are then updated to the result and the project version is bumped, so cached
+    maps and exports are rebuilt.
+    """
+    session = get_session()
+    project = session.get(Project, project_id)
+    main_location = project.main_location
+    stored = session.execute(
+        select(
+            ProjectAddress.id,
+            ProjectAddress.address,
+            ProjectAddress.lat,
+            ProjectAddress.lon,
+            ProjectAddress.routes,
+        )
+        .where(ProjectAddress.project_id == project_id)
+        .order_by(ProjectAddress.id)
+    ).all()
+    session.close()
+    if not stored:
+        st.warning(
+            "Für dieses Projekt sind keine Adressen gespeichert. Erstellen Sie das Projekt "
+            "neu, um die Adressliste aktualisieren zu können."
+        )
+        return None
+
+    added, removed_ids = diff_addresses([(row.id, row.address) for row in stored], address_list)
+    if progress_callback:
+        progress_callback(f"{len(added)} Adressen hinzugefügt, {len(removed_ids)} entfernt")
+    geocoded = geocode_addresses(added, progress_callback, force, checkpoints)
+    if geocoded is None:
+        return None
+    found, locations = geocoded
+    addresses = [added[i] for i in found]
+
+    removed = set(removed_ids)
+    kept = [row for row in stored if row.id not in removed]
+    kept_routes = [decode_address_routes(row.routes) for row in kept]
+    segments, service_routes = compute_segments(
+        main_location,
+        [Location(name=row.address, lat=row.lat, lon=row.lon, osm_id=0) for row in kept]
+        + locations,
+        progress_callback=lambda p: (
+            progress_callback(f"Berechnung der Schulwege: {p}") if progress_callback else None
+        ),
+        checkpoints=checkpoints,
+        stored_routes=kept_routes + [{} for _ in locations],
+    )
+    refreshed_routes = {
+        row.id: routes
+        for row, old_routes, routes in zip(kept, kept_routes, service_routes)
+        if routes.keys() != old_routes.keys()
+    }
+
+    run_stage(
+        checkpoints,
+        "project",
+        lambda: apply_address_update(
+            project_id,
+            segments,
+            addresses,
+            locations,
+            service_routes[len(kept) :],
+            removed_ids,
+            refreshed_routes,
+            progress_callback,
+        ),
+    )
+    session = get_session()
+    project = session.get(Project, project_id)
+    segments = session.scalars(select(Segment).where(Segment.project_id == project_id)).all()
+    session.close()
+
+    build_tiles(project.id, segments, progress_callback)
+    st.success(f"Projekt '{project.name}' wurde erfolgreich aktualisiert!")
+    if progress_callback:
+        progress_callback("Fertig!")
+    return project
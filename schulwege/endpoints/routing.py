@@ -1,20 +1,38 @@
 from collections import Counter
 from datetime import datetime, timedelta
+from heapq import heappop, heappush
+from itertools import count
 import json
 from math import atan2, cos, radians, sin, sqrt
 import os
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 import osmnx as ox
 import networkx as nx
-from shapely import MultiPoint
+import numpy as np
+from shapely import MultiPoint, Polygon
 import streamlit as st
 
-from schulwege.endpoints.opentripplaner import get_public_transport_route
+from schulwege.endpoints.checkpoints import Checkpoints, run_stage
+from schulwege.endpoints.csr_routing import CSRGraph
+from schulwege.endpoints.graph_store import clip_graph_store, has_graph_store, load_graph_store
+from schulwege.endpoints.opentripplaner import get_public_transport_routes
+from schulwege.endpoints.segments import segment_from_row, segment_to_row
+from schulwege.endpoints.snapping import snap_locations
 from schulwege.models.location import Location
 from schulwege.models.project import Project
 from schulwege.models.segment import Segment
 
 
+def get_hull(locations: List[Location], buffer_meters=2000) -> Polygon:
+    """Get the buffered convex hull of the given locations."""
+    points = [(loc.lat, loc.lon) for loc in locations if loc.coordinates is not None]
+    if not points:
+        raise ValueError("No valid coordinates found in locations.")
+    hull = MultiPoint([(lon, lat) for lat, lon in points]).convex_hull
+    buffer_degrees = buffer_meters / 111320
+    return hull.buffer(buffer_degrees)
+
+
 @st.cache_data(
     persist="disk",
     hash_funcs={Location: lambda loc: (loc.lat, loc.lon) if loc.coordinates else loc.to_string()},
@@ -30,12 +48,7 @@ def get_graph_in_hull(
     Returns:
         ox.graph.Graph: The loaded OSMnx graph.
     """
-    points = [(loc.lat, loc.lon) for loc in locations if loc.coordinates is not None]
-    if not points:
-        raise ValueError("No valid coordinates found in locations.")
-    hull = MultiPoint([(lon, lat) for lat, lon in points]).convex_hull
-    buffer_degrees = buffer_meters / 111320
-    hull = hull.buffer(buffer_degrees)
+    hull = get_hull(locations, buffer_meters)
     graph = ox.graph_from_polygon(hull, network_type=network_type)
     return graph
 
@@ -47,9 +60,29 @@ def load_model_config() -> List[dict]:
     return config
 
 
-def get_road_network(locations, network_type: str) -> nx.MultiDiGraph:
-    graph = get_graph_in_hull(locations, network_type=network_type)
-    return graph
+def get_routing_backend() -> str:
+    """Get the routing backend ("csr" or "networkx") from environment variables."""
+    return os.getenv("ROUTING_BACKEND", "csr")
+
+
+def get_road_network(
+    main_location: Location, locations: List[Location], network_type: str
+) -> Union[nx.MultiDiGraph, CSRGraph]:
+    """Load the road network covering the main location and the given locations.
+
+    The network is clipped from the offline graph store if one has been built for the
+    network type, otherwise it is downloaded from Overpass. It is converted once to the
+    representation of the configured routing backend.
+    """
+    if has_graph_store(network_type):
+        hull = get_hull([main_location] + locations)
+        graph = clip_graph_store(load_graph_store(network_type), hull)
+    else:
+        graph = get_graph_in_hull([main_location] + locations, network_type=network_type)
+
+    if get_routing_backend() == "networkx":
+        return graph.to_networkx() if isinstance(graph, CSRGraph) else graph
+    return graph if isinstance(graph, CSRGraph) else CSRGraph.from_networkx(graph)
 
 
 def haversine(locationA: Location, locationB: Location) -> float:
@@ -64,61 +97,301 @@ def haversine(locationA: Location, locationB: Location) -> float:
     return distance
 
 
-def compute_walking_routes(
+def locations_in_ring(
+    main_location: Location, locations: List[Location], min_radius: float, max_radius: float
+) -> List[int]:
+    """Get the indices of all locations within the radius ring around the main location."""
+    return [
+        i
+        for i, loc in enumerate(locations)
+        if min_radius <= haversine(main_location, loc) <= max_radius
+    ]
+
+
+def shortest_path_tree(
+    network: nx.MultiDiGraph, origin_node: int, target_nodes, weight: str = "length"
+) -> Tuple[Dict[int, float], Dict[int, int]]:
+    """Run a single Dijkstra search from the origin node.
+
+    The search stops as soon as every target node is settled, so only the part of the
+    graph that is actually needed is explored. Parallel edges are weighted by their
+    shortest member, exactly like ``ox.shortest_path``.
+
+    Args:
+        network (nx.MultiDiGraph): The road network.
+        origin_node (int): The node to start the search from.
+        target_nodes (Iterable[int]): Nodes whose shortest paths are required.
+        weight (str): The edge attribute used as weight.
+    Returns:
+        Tuple[Dict[int, float], Dict[int, int]]: Distances and predecessors of all settled nodes.
+    """
+    remaining = set(target_nodes)
+    dist = {}
+    pred = {origin_node: None}
+    seen = {origin_node: 0}
+    counter = count()
+    heap = [(0, next(counter), origin_node)]
+    while heap and remaining:
+        d, _, node = heappop(heap)
+        if node in dist:
+            continue
+        dist[node] = d
+        remaining.discard(node)
+        for neighbor, edges in network._adj[node].items():
+            cost = min(attr.get(weight, 1) for attr in edges.values())
+            new_dist = d + cost
+            if neighbor in dist:
+                continue
+            if neighbor not in seen or new_dist < seen[neighbor]:
+                seen[neighbor] = new_dist
+                pred[neighbor] = node
+                heappush(heap, (new_dist, next(counter), neighbor))
+    return dist, pred
+
+
+def path_from_tree(pred: Dict[int, int], dist: Dict[int, float], node: int) -> List[int]:
+    """Rebuild the path from the tree root to the given node from a predecessor map."""
+    if node not in dist:
+        return []
+    path = [node]
+    while pred[path[-1]] is not None:
+        path.append(pred[path[-1]])
+    path.reverse()
+    return path
+
+
+def load_ring_network(
     main_location: Location,
     locations: List[Location],
     min_radius: float,
     max_radius: float,
+    network_type: str,
+    label: str,
     progress_callback=None,
-) -> List[List[Tuple[float, float]]]:
-
+) -> Optional[Union[nx.MultiDiGraph, CSRGraph]]:
+    """Load the road network for the locations within the radius ring, if there are any."""
+    in_radius = locations_in_ring(main_location, locations, min_radius, max_radius)
+    if not in_radius:
+        return None
     if progress_callback:
-        progress_callback("Lade Straßennetz für Laufwege...")
-    network = get_road_network(locations, network_type="walk")
-    routes = []
-    origin_node = ox.distance.nearest_nodes(network, main_location.lon, main_location.lat)
+        progress_callback(f"Lade Straßennetz für {label}...")
+    return get_road_network(
+        main_location, [locations[i] for i in in_radius], network_type=network_type
+    )
 
-    for i, loc in enumerate(locations):
-        dist = haversine(main_location, loc)
-        if dist < min_radius or dist > max_radius:
-            routes.append([])
+
+def snap_ring_destinations(
+    network: Union[nx.MultiDiGraph, CSRGraph],
+    main_location: Location,
+    locations: List[Location],
+    min_radius: float,
+    max_radius: float,
+    label: str,
+) -> Tuple[int, Dict[int, int]]:
+    """Snap the main location and all locations within the radius ring to the network.
+
+    Locations too far away from the network are reported and left out.
+
+    Returns:
+        Tuple[int, Dict[int, int]]: The origin node and the destination node of every
+            routable location by its index.
+    """
+    in_radius = locations_in_ring(main_location, locations, min_radius, max_radius)
+    nodes, snap_distances = snap_locations(
+        network, [main_location] + [locations[i] for i in in_radius]
+    )
+    origin_node = int(nodes[0])
+
+    max_snap_distance = load_model_config().get("max_snap_distance", 500)
+    destination_nodes = {}
+    off_network = []
+    for i, node, snap_distance in zip(in_radius, nodes[1:], snap_distances[1:]):
+        if snap_distance > max_snap_distance:
+            off_network.append(locations[i])
             continue
-        if progress_callback:
-            progress_callback(f"Berechne Laufwege {i+1}/{len(locations)}")
-        destination_node = ox.distance.nearest_nodes(network, loc.lon, loc.lat)
-        route = ox.shortest_path(network, origin_node, destination_node, weight="length")
-        route_coords = [(network.nodes[node]["y"], network.nodes[node]["x"]) for node in route]
-        routes.append(route_coords)
-    return routes
+        destination_nodes[i] = int(node)
+    if off_network:
+        st.warning(
+            f"{len(off_network)} Adressen liegen mehr als {max_snap_distance} m vom Straßennetz "
+            f"entfernt und werden bei den {label}n nicht berücksichtigt:\n- "
+            + "\n- ".join(loc.to_string() for loc in off_network)
+        )
+    return origin_node, destination_nodes
+
+
+def compute_network_tree(
+    network: Union[nx.MultiDiGraph, CSRGraph], origin_node: int, destination_nodes: Dict[int, int]
+):
+    """Compute the shortest path tree from the origin node with the network's backend."""
+    if isinstance(network, CSRGraph):
+        return network.shortest_path_tree(origin_node)
+    return shortest_path_tree(network, origin_node, destination_nodes.values())
+
+
+def drop_unreachable_destinations(
+    network: Union[nx.MultiDiGraph, CSRGraph],
+    dist,
+    locations: List[Location],
+    destination_nodes: Dict[int, int],
+    label: str,
+) -> Dict[int, int]:
+    """Report the locations the shortest path tree does not reach and leave them out.
 
+    A location can snap close to a way that is not reachable from the main location,
+    e.g. behind a one-way street. It is reported like an off-network location instead of
+    getting an empty route.
 
-def compute_bicycling_route(
+    Returns:
+        Dict[int, int]: The destination node of every reachable location by its index.
+    """
+    if isinstance(network, CSRGraph):
+        nodes = np.fromiter(destination_nodes.values(), dtype=np.int64)
+        reachable = dict(
+            zip(destination_nodes, np.isfinite(dist[network.index_of(nodes)]).tolist())
+        )
+    else:
+        reachable = {i: node in dist for i, node in destination_nodes.items()}
+    unreachable = [i for i, is_reachable in reachable.items() if not is_reachable]
+    if unreachable:
+        st.warning(
+            f"{len(unreachable)} Adressen sind über das Straßennetz nicht erreichbar und werden "
+            f"bei den {label}n nicht berücksichtigt:\n- "
+            + "\n- ".join(locations[i].to_string() for i in unreachable)
+        )
+    return {i: node for i, node in destination_nodes.items() if reachable[i]}
+
+
+def compute_network_routes(
+    network: Union[nx.MultiDiGraph, CSRGraph],
     main_location: Location,
     locations: List[Location],
     min_radius: float,
     max_radius: float,
+    label: str,
     progress_callback=None,
 ) -> List[List[Tuple[float, float]]]:
+    """Compute the routes from the main location to all locations within the radius ring.
 
+    All routes share the main location as origin, so a single shortest path tree is
+    computed and every route is rebuilt from its predecessor map.
+    """
+    origin_node, destination_nodes = snap_ring_destinations(
+        network, main_location, locations, min_radius, max_radius, label
+    )
     if progress_callback:
-        progress_callback("Lade Straßennetz für Fahrradwege...")
-    network = get_road_network(locations, network_type="bike")
+        progress_callback(f"Berechne {label} für {len(destination_nodes)} Adressen...")
+    dist, pred = compute_network_tree(network, origin_node, destination_nodes)
+    destination_nodes = drop_unreachable_destinations(
+        network, dist, locations, destination_nodes, label
+    )
+
     routes = []
-    origin_node = ox.distance.nearest_nodes(network, main_location.lon, main_location.lat)
-    for i, loc in enumerate(locations):
-        dist = haversine(main_location, loc)
-        if dist < min_radius or dist > max_radius:
+    for i in range(len(locations)):
+        if i not in destination_nodes:
             routes.append([])
             continue
-        if progress_callback:
-            progress_callback(f"Berechne Fahrradwege {i+1}/{len(locations)}")
-        destination_node = ox.distance.nearest_nodes(network, loc.lon, loc.lat)
-        route = ox.shortest_path(network, origin_node, destination_node, weight="length")
-        route_coords = [(network.nodes[node]["y"], network.nodes[node]["x"]) for node in route]
+        if isinstance(network, CSRGraph):
+            route = network.path_from_tree(pred, dist, destination_nodes[i])
+            route_coords = network.path_coordinates(route)
+        else:
+            route = path_from_tree(pred, dist, destination_nodes[i])
+            route_coords = [(network.nodes[node]["y"], network.nodes[node]["x"]) for node in route]
         routes.append(route_coords)
     return routes
 
 
+def accumulate_tree_flows(
+    pred: Dict[int, int], dist: Dict[int, float], weights: Dict[int, int]
+) -> Dict[int, int]:
+    """Sum the weights of every subtree of a shortest path tree found by ``shortest_path_tree``.
+
+    Nodes are settled in order of distance, so visiting them in reverse settle order
+    handles every node after all of its children.
+    """
+    flow = dict(weights)
+    for node in reversed(dist):
+        parent = pred[node]
+        if parent is not None and flow.get(node):
+            flow[parent] = flow.get(parent, 0) + flow[node]
+    return flow
+
+
+def compute_network_flows(
+    network: Union[nx.MultiDiGraph, CSRGraph],
+    main_location: Location,
+    locations: List[Location],
+    min_radius: float,
+    max_radius: float,
+    label: str,
+    modality: str,
+    progress_callback=None,
+) -> List[Segment]:
+    """Compute how many routes use each edge of the shortest path tree.
+
+    All routes start at the main location and follow the shortest path tree, so the
+    frequency of an edge is the number of locations in the subtree below it. This is
+    accumulated in a single pass over the tree instead of expanding every route.
+
+    Returns:
+        List[Segment]: One segment per used tree edge, keyed by its graph nodes.
+    """
+    origin_node, destination_nodes = snap_ring_destinations(
+        network, main_location, locations, min_radius, max_radius, label
+    )
+    if progress_callback:
+        progress_callback(f"Berechne {label} für {len(destination_nodes)} Adressen...")
+    dist, pred = compute_network_tree(network, origin_node, destination_nodes)
+    destination_nodes = drop_unreachable_destinations(
+        network, dist, locations, destination_nodes, label
+    )
+
+    if isinstance(network, CSRGraph):
+        weights = np.bincount(
+            network.index_of(list(destination_nodes.values())), minlength=len(network)
+        )
+        flow = network.accumulate_flows(pred, dist, weights)
+        edges = np.flatnonzero((pred >= 0) & (flow > 0))
+        node_ids, lat, lon = network.node_ids, network.lat, network.lon
+        return [
+            Segment(
+                node_from=node_from,
+                node_to=node_to,
+                lat_from=lat_from,
+                lon_from=lon_from,
+                lat_to=lat_to,
+                lon_to=lon_to,
+                modality=modality,
+                frequency=frequency,
+            )
+            for node_from, node_to, lat_from, lon_from, lat_to, lon_to, frequency in zip(
+                node_ids[pred[edges]].tolist(),
+                node_ids[edges].tolist(),
+                lat[pred[edges]].tolist(),
+                lon[pred[edges]].tolist(),
+                lat[edges].tolist(),
+                lon[edges].tolist(),
+                flow[edges].tolist(),
+            )
+        ]
+
+    flow = accumulate_tree_flows(pred, dist, Counter(destination_nodes.values()))
+    nodes = network.nodes
+    return [
+        Segment(
+            node_from=pred[node],
+            node_to=node,
+            lat_from=nodes[pred[node]]["y"],
+            lon_from=nodes[pred[node]]["x"],
+            lat_to=nodes[node]["y"],
+            lon_to=nodes[node]["x"],
+            modality=modality,
+            frequency=frequency,
+        )
+        for node, frequency in flow.items()
+        if frequency > 0 and node in dist and pred[node] is not None
+    ]
+
+
 def compute_public_transport_walking_route(
     main_location: Location,
     locations: List[Location],
@@ -127,164 +400,360 @@ def compute_public_transport_walking_route(
     min_radius: float,
     max_radius: float,
     progress_callback=None,
-) -> List[List[Tuple[float, float]]]:
+) -> List[List[List[Tuple[float, float]]]]:
+    """Compute the walking parts of the public transport routes to all locations.
 
-    routes = []
-    for i, loc in enumerate(locations):
-        dist = haversine(main_location, loc)
-        if dist < min_radius or dist > max_radius:
-            routes.append([])
-            continue
-        if progress_callback:
-            progress_callback(f"Berechne ÖPNV-Wege {i+1}/{len(locations)}")
-        route, modalities = get_public_transport_route(
-            origin=main_location,
-            destination=loc,
-            date=date,
-            time=time,
-            transport_modes=[
-                "BUS",
-                "TRAM",
-                "RAIL",
-                "SUBWAY",
-                "FERRY",
-                "GONDOLA",
-                "FUNICULAR",
-                "WALK",
-            ],
+    Returns:
+        List[List[List[Tuple[float, float]]]]: The walking routes of every location.
+    """
+
+    in_radius = locations_in_ring(main_location, locations, min_radius, max_radius)
+    destinations = [locations[i] for i in in_radius]
+    results, errors = get_public_transport_routes(
+        origin=main_location,
+        destinations=destinations,
+        date=date,
+        time=time,
+        transport_modes=[
+            "BUS",
+            "TRAM",
+            "RAIL",
+            "SUBWAY",
+            "FERRY",
+            "GONDOLA",
+            "FUNICULAR",
+            "WALK",
+        ],
+        progress_callback=lambda done, total: (
+            progress_callback(f"Berechne ÖPNV-Wege {done}/{total}") if progress_callback else None
+        ),
+    )
+    if errors:
+        st.warning(
+            f"{len(errors)} ÖPNV-Wege konnten nicht berechnet werden:\n- "
+            + "\n- ".join(f"{destinations[i].to_string()}: {e}" for i, e in errors.items())
         )
-        if len(route) == 0:
-            routes.append([])
-            continue
+    results = dict(zip(in_radius, results))
 
+    routes = []
+    for i in range(len(locations)):
+        route, modalities = results.get(i, ([], []))
+        walking_routes = []
         current_route = []
-        for j in range(len(route)):
-            point = route[j]
-            modality = modalities[j]
+        for point, modality in zip(route, modalities):
             if modality == "oepnv-walk":
                 current_route.append(point)
-            else:
-                if len(current_route) > 0:
-                    routes.append(current_route)
-                    current_route = []
+            elif len(current_route) > 0:
+                walking_routes.append(current_route)
+                current_route = []
         if len(current_route) > 0:
-            routes.append(current_route)
+            walking_routes.append(current_route)
+        routes.append(walking_routes)
 
     return routes
 
 
-def compute_school_routes(
-    main_location: Location, locations: List[Location], progress_callback=None
-) -> Tuple[List[List[Tuple[float, float]]], List[str]]:
+NETWORK_MODALITIES = {
+    "walk": ("walk", "Laufwege"),
+    "bicycle": ("bike", "Fahrradwege"),
+}
 
-    model_config = load_model_config()
-    if not "routing" in model_config:
-        raise ValueError("No routing configuration found in model config.")
-    routing_config = model_config.get("routing", [])
-    routes = []
-    route_modalities = []
-    for i, route_cfg in enumerate(routing_config):
-        modality = route_cfg.get("modality")
-        modality_display_name = route_cfg.get("modality_display_name", modality)
-        min_radius = route_cfg.get("min_radius", 0)
-        max_radius = route_cfg.get("max_radius", -1)
-        if max_radius == -1:
-            max_radius = float("inf")
-        if modality == "walk":
-            walking_routes = compute_walking_routes(
-                main_location,
-                locations,
-                min_radius,
-                max_radius,
-                progress_callback=lambda p: (
-                    progress_callback(f"[{i+1}/{len(routing_config)}] {p}")
-                    if progress_callback
-                    else None
-                ),
-            )
-            routes.extend(walking_routes)
-            route_modalities.extend([modality_display_name] * len(walking_routes))
-        elif modality == "bicycle":
-            bike_routes = compute_bicycling_route(
+
+def compute_modality_routes(
+    main_location: Location,
+    locations: List[Location],
+    route_cfg: dict,
+    edge_flow: bool = False,
+    progress_callback=None,
+    network: Optional[Union[nx.MultiDiGraph, CSRGraph]] = None,
+) -> Tuple[List[List[List[Tuple[float, float]]]], List[Segment]]:
+    """Compute the routes of a single routing configuration entry.
+
+    Args:
+        network (Optional[Union[nx.MultiDiGraph, CSRGraph]]): The road network of the
+            radius ring (see ``load_ring_network``), loaded if not given.
+    Returns:
+        Tuple[List[List[List[Tuple[float, float]]]], List[Segment]]: The routes of every
+            location and the edge-keyed segments of the edge flow modalities.
+    """
+    modality = route_cfg.get("modality")
+    modality_display_name = route_cfg.get("modality_display_name", modality)
+    min_radius = route_cfg.get("min_radius", 0)
+    max_radius = route_cfg.get("max_radius", -1)
+    if max_radius == -1:
+        max_radius = float("inf")
+    if modality in NETWORK_MODALITIES:
+        network_type, label = NETWORK_MODALITIES[modality]
+        if network is None:
+            network = load_ring_network(
                 main_location,
                 locations,
                 min_radius,
                 max_radius,
-                progress_callback=lambda p: (
-                    progress_callback(f"[{i+1}/{len(routing_config)}] {p}")
-                    if progress_callback
-                    else None
-                ),
+                network_type,
+                label,
+                progress_callback=progress_callback,
             )
-            routes.extend(bike_routes)
-            route_modalities.extend([modality_display_name] * len(bike_routes))
-        elif modality == "public_transport_walking":
-            now = datetime.now()
-            monday = now - timedelta(days=now.weekday())
-            now = monday.replace(hour=7, minute=0, second=0, microsecond=0)
-            date_str = monday.strftime("%Y-%m-%d")
-            time_str = monday.strftime("%H:%M")
-
-            public_transport_walking_routes = compute_public_transport_walking_route(
+        if network is None:
+            return [[] for _ in locations], []
+        if edge_flow:
+            return [[] for _ in locations], compute_network_flows(
+                network,
                 main_location,
                 locations,
-                date_str,
-                time_str,
                 min_radius,
                 max_radius,
-                progress_callback=lambda p: (
-                    progress_callback(f"[{i+1}/{len(routing_config)}] {p}")
-                    if progress_callback
-                    else None
-                ),
+                label,
+                modality_display_name,
+                progress_callback=progress_callback,
             )
-            routes.extend(public_transport_walking_routes)
-            route_modalities.extend([modality_display_name] * len(public_transport_walking_routes))
-        else:
-            st.warning(f"Unbekannte Routing-Modality: {modality}")
-    return routes, route_modalities
+        routes = compute_network_routes(
+            network,
+            main_location,
+            locations,
+            min_radius,
+            max_radius,
+            label=label,
+            progress_callback=progress_callback,
+        )
+        return [[route] if route else [] for route in routes], []
+    elif modality == "public_transport_walking":
+        now = datetime.now()
+        monday = now - timedelta(days=now.weekday())
+        monday = monday.replace(hour=7, minute=0, second=0, microsecond=0)
+        date_str = monday.strftime("%Y-%m-%d")
+        time_str = monday.strftime("%H:%M")
+
+        location_routes = compute_public_transport_walking_route(
+            main_location,
+            locations,
+            date_str,
+            time_str,
+            min_radius,
+            max_radius,
+            progress_callback=progress_callback,
+        )
+        return location_routes, []
+    st.warning(f"Unbekannte Routing-Modality: {modality}")
+    return [[] for _ in locations], []
+
+
+def compute_school_routes(
+    main_location: Location,
+    locations: List[Location],
+    progress_callback=None,
+    edge_flow: bool = False,
+    checkpoints: Optional[Checkpoints] = None,
+    stored_routes: Optional[List[Dict[str, List[List[Tuple[float, float]]]]]] = None,
+) -> Tuple[
+    List[List[Tuple[float, float]]],
+    List[str],
+    List[Segment],
+    List[Dict[str, List[List[Tuple[float, float]]]]],
+]:
+    """Compute the routes from the main location to all locations for every configured modality.
+
+    With ``edge_flow``, walking and cycling are not expanded into routes but directly
+    counted per edge of their shortest path tree. The modalities without a road network
+    are routed by external services, so their routes are also returned per location
+    and keyed by the routing configuration entry. Passed back in as ``stored_routes``,
+    these locations are not sent to the service again. With ``checkpoints``, the
+    result of every routing configuration entry is stored and reused by a retried run.
 
+    Returns:
+        tuple: The routes, the modality of each route, the edge-keyed segments of the edge
+            flow modalities and the service routes of every location.
+    """
+
+    model_config = load_model_config()
+    if not "routing" in model_config:
+        raise ValueError("No routing configuration found in model config.")
+    routing_config = model_config.get("routing", [])
+    if stored_routes is None:
+        stored_routes = [{} for _ in locations]
+    routes = []
+    route_modalities = []
+    edge_segments = []
+    service_routes = [{} for _ in locations]
+    for i, route_cfg in enumerate(routing_config):
+        cfg_key = json.dumps(route_cfg, sort_keys=True)
+        is_service = route_cfg.get("modality") not in NETWORK_MODALITIES
+        pending = [
+            j for j in range(len(locations)) if not is_service or cfg_key not in stored_routes[j]
+        ]
+        location_routes, modality_edge_segments = run_stage(
+            checkpoints,
+            f"routes:{i}:{cfg_key}:{edge_flow}",
+            lambda: (
+                compute_modality_routes(
+                    main_location,
+                    [locations[j] for j in pending],
+                    route_cfg,
+                    edge_flow=edge_flow,
+                    progress_callback=lambda p: (
+                        progress_callback(f"[{i+1}/{len(routing_config)}] {p}")
+                        if progress_callback
+                        else None
+                    ),
+                )
+                if pending
+                else ([], [])
+            ),
+            encode=lambda result: [
+                result[0],
+                [segment_to_row(segment) for segment in result[1]],
+            ],
+            decode=lambda data: (
+                [[[tuple(point) for point in route] for route in routes] for routes in data[0]],
+                [segment_from_row(row) for row in data[1]],
+            ),
+        )
+        computed = dict(zip(pending, location_routes))
+        modality = route_cfg.get("modality_display_name", route_cfg.get("modality"))
+        for j in range(len(locations)):
+            routes_of_location = computed[j] if j in computed else stored_routes[j][cfg_key]
+            if is_service:
+                service_routes[j][cfg_key] = routes_of_location
+            routes.extend(routes_of_location)
+            route_modalities.extend([modality] * len(routes_of_location))
+        edge_segments.extend(modality_edge_segments)
+    return routes, route_modalities, edge_segments, service_routes
+
+
+def encode_route_coordinates(
+    routes: List[List[Tuple[float, float]]], precision: int = 5
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode all route points as int32 fixed-point coordinates.
 
-def round_route_coordinates(
-    route: List[Tuple[float, float]], precision: int = 5
-) -> List[Tuple[float, float]]:
-    return [(round(lat, precision), round(lon, precision)) for lat, lon in route]
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (lat, lon) fixed-point coordinates of all points
+            of all routes, and the index of the route each point belongs to.
+    """
+    lengths = np.fromiter((len(route) for route in routes), dtype=np.int64, count=len(routes))
+    points = np.fromiter(
+        (value for route in routes for point in route for value in point),
+        dtype=np.float64,
+        count=2 * int(lengths.sum()),
+    ).reshape(-1, 2)
+    coordinates = np.rint(points * 10**precision).astype(np.int32)
+    route_ids = np.repeat(np.arange(len(routes)), lengths)
+    return coordinates, route_ids
+
+
+def coordinates_of(packed_points: np.ndarray) -> np.ndarray:
+    """Unpack int64-packed points into (lat, lon) fixed-point coordinates."""
+    lat = (packed_points >> 32).astype(np.int32)
+    lon = (packed_points & 0xFFFFFFFF).astype(np.uint32).view(np.int32)
+    return np.column_stack((lat, lon))
+
+
+def count_route_segments(
+    routes: List[List[Tuple[float, float]]],
+    route_modalities: List[str],
+    precision: int = 5,
+    min_frequency: int = 1,
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Count how often each segment between two consecutive route points is used.
 
+    Args:
+        routes (list[list[tuple[float, float]]]): The routes as (lat, lon) points.
+        route_modalities (list[str]): The modality of each route.
+        precision (int): The number of decimals the coordinates are rounded to.
+        min_frequency (int): Segments used less often are dropped.
+    Returns:
+        Tuple[np.ndarray, np.ndarray, List[str]]: The segment keys as rows of fixed-point
+            (lat_from, lon_from, lat_to, lon_to, modality code), their frequencies and the
+            modality of each code.
+    """
+    modality_index = {
+        modality: code for code, modality in enumerate(dict.fromkeys(route_modalities))
+    }
+    modality_codes = np.array([modality_index[m] for m in route_modalities], dtype=np.int64)
+    num_modalities = max(len(modality_index), 1)
+    coordinates, route_ids = encode_route_coordinates(routes, precision)
+    same_route = np.flatnonzero(route_ids[1:] == route_ids[:-1])
+
+    # rank the distinct points, so every segment key packs into a single int64
+    packed_points = (coordinates[:, 0].astype(np.int64) << 32) | (
+        coordinates[:, 1].astype(np.int64) & 0xFFFFFFFF
+    )
+    points, point_ids = np.unique(packed_points, return_inverse=True)
+    num_points = max(len(points), 1)
+    segment_keys = (
+        point_ids[same_route] * num_points + point_ids[same_route + 1]
+    ) * num_modalities + modality_codes[route_ids[same_route]]
+    segment_keys, frequencies = np.unique(segment_keys, return_counts=True)
+    frequent = frequencies >= min_frequency
+    segment_keys, frequencies = segment_keys[frequent], frequencies[frequent]
+
+    point_pairs, codes = np.divmod(segment_keys, num_modalities)
+    start_ids, end_ids = np.divmod(point_pairs, num_points)
+    start, end = coordinates_of(points[start_ids]), coordinates_of(points[end_ids])
+    keys = np.column_stack((start, end, codes)).astype(np.int32)
+    return keys, frequencies, list(modality_index)
+
+
+def compute_segments(
+    main_location: Location,
+    locations: List[Location],
+    progress_callback=None,
+    checkpoints: Optional[Checkpoints] = None,
+    stored_routes: Optional[List[Dict[str, List[List[Tuple[float, float]]]]]] = None,
+) -> Tuple[List[Segment], List[Dict[str, List[List[Tuple[float, float]]]]]]:
+    """Compute the segments of the routes to all locations that are used often enough.
 
-def compute_segments(main_location: Location, locations: List[Location], progress_callback=None):
+    Returns:
+        Tuple[List[Segment], List[Dict[str, List[List[Tuple[float, float]]]]]]: The
+            segments and the service routes of every location (see
+            ``compute_school_routes``).
+    """
 
-    routes, route_modalities = compute_school_routes(
+    model_config = load_model_config()
+    routes, route_modalities, edge_segments, service_routes = compute_school_routes(
         main_location,
         locations,
         progress_callback=progress_callback,
+        edge_flow=model_config.get("segment_counting", "routes") == "edge_flow",
+        checkpoints=checkpoints,
+        stored_routes=stored_routes,
     )
 
-    model_config = load_model_config()
-    min_frequency = model_config.get("min_segment_frequency", 1)
-    counter = Counter()
     if progress_callback:
         progress_callback("Berechne Routensegmente...")
-    for i, (route, modality) in enumerate(zip(routes, route_modalities)):
-        if progress_callback:
-            progress_callback(f"Berechne Routensegmente {i+1}/{len(routes)}...")
-        if len(route) == 0:
-            continue
-        rounded_route = tuple(round_route_coordinates(route))
-        start = rounded_route[0]
-        for end in rounded_route[1:]:
-            segment_key = (start, end, modality)
-            counter[segment_key] += 1
-            start = end
+    segments = segments_from_routes(
+        routes,
+        route_modalities,
+        edge_segments,
+        precision=model_config.get("coordinate_precision", 5),
+        min_frequency=model_config.get("min_segment_frequency", 1),
+    )
+    return segments, service_routes
+
+
+def segments_from_routes(
+    routes: List[List[Tuple[float, float]]],
+    route_modalities: List[str],
+    edge_segments: List[Segment],
+    precision: int = 5,
+    min_frequency: int = 1,
+) -> List[Segment]:
+    """Count the route segments and add the edge-keyed segments used often enough."""
+    keys, frequencies, modalities = count_route_segments(
+        routes, route_modalities, precision=precision, min_frequency=min_frequency
+    )
+    coordinates = (keys[:, :4] / 10**precision).tolist()
     segments = [
         Segment(
-            lat_from=start[0],
-            lon_from=start[1],
-            lat_to=end[0],
-            lon_to=end[1],
-            modality=modality,
+            lat_from=lat_from,
+            lon_from=lon_from,
+            lat_to=lat_to,
+            lon_to=lon_to,
+            modality=modalities[code],
             frequency=count,
         )
-        for (start, end, modality), count in counter.items()
-        if count >= min_frequency
+        for (lat_from, lon_from, lat_to, lon_to), code, count in zip(
+            coordinates, keys[:, 4].tolist(), frequencies.tolist()
+        )
     ]
+    segments.extend(segment for segment in edge_segments if segment.frequency >= min_frequency)
     return segments
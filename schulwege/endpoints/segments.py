@@ -0,0 +1,64 @@
+import time
+from typing import List
+
+import pandas as pd
+from sqlalchemy import select
+
+from sqlalchemy.orm import Session
+
+from schulwege.models.segment import Segment
+
+SEGMENT_COLUMNS = (
+    "lat_from",
+    "lon_from",
+    "lat_to",
+    "lon_to",
+    "frequency",
+    "modality",
+    "node_from",
+    "node_to",
+)
+FREQUENCY_INDEX = SEGMENT_COLUMNS.index("frequency")
+
+
+def segment_to_row(segment: Segment) -> tuple:
+    return tuple(getattr(segment, column) for column in SEGMENT_COLUMNS)
+
+
+def segment_from_row(row) -> Segment:
+    return Segment(**dict(zip(SEGMENT_COLUMNS, row)))
+
+
+def segment_key(row) -> tuple:
+    """Get the identity of a segment row, i.e. all of its columns but the frequency."""
+    return tuple(row[:FREQUENCY_INDEX]) + tuple(row[FREQUENCY_INDEX + 1 :])
+
+
+def insert_segments(session: Session, project_id: int, segments: List[Segment]) -> float:
+    """Insert the segments of a project in one executemany statement.
+
+    The rows go through a Core insert on the table, so the segments are neither added
+    to the session nor tracked by its identity map, and rows with and without node ids
+    share one batch. The caller commits the transaction.
+
+    Returns:
+        float: The insert rate in rows per second.
+    """
+    if not segments:
+        return 0.0
+    rows = [
+        {**dict(zip(SEGMENT_COLUMNS, segment_to_row(segment))), "project_id": project_id}
+        for segment in segments
+    ]
+    start = time.perf_counter()
+    session.execute(Segment.__table__.insert(), rows)
+    return len(rows) / max(time.perf_counter() - start, 1e-9)
+
+
+def load_segment_frame(session: Session, project_id: int) -> pd.DataFrame:
+    """Load the segments of a project as a table without building ORM objects."""
+    columns = [Segment.id] + [getattr(Segment, column) for column in SEGMENT_COLUMNS]
+    result = session.execute(
+        select(*columns).where(Segment.project_id == project_id).order_by(Segment.id)
+    )
+    return pd.DataFrame(result.all(), columns=list(result.keys()))
@@ -0,0 +1,52 @@
+from typing import List, Tuple, Union
+import networkx as nx
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from schulwege.endpoints.csr_routing import CSRGraph
+from schulwege.models.location import Location
+
+EARTH_RADIUS = 6371000  # meters
+
+
+def get_node_index(network: Union[nx.MultiDiGraph, CSRGraph]) -> Tuple[np.ndarray, BallTree]:
+    """Get the spatial node index of a road network.
+
+    The index is built once per loaded graph and kept in the graph attributes, so
+    every further snap against the same graph reuses it.
+
+    Args:
+        network (Union[nx.MultiDiGraph, CSRGraph]): The road network.
+    Returns:
+        Tuple[np.ndarray, BallTree]: The node ids and a haversine ball tree over their coordinates.
+    """
+    index = network.graph.get("node_index")
+    if index is None:
+        if isinstance(network, CSRGraph):
+            node_ids = network.node_ids
+            coords = np.column_stack((network.lat, network.lon))
+        else:
+            node_ids = np.fromiter(network.nodes, dtype=np.int64, count=network.number_of_nodes())
+            coords = np.array([(data["y"], data["x"]) for _, data in network.nodes(data=True)])
+        index = (node_ids, BallTree(np.radians(coords), metric="haversine"))
+        network.graph["node_index"] = index
+    return index
+
+
+def snap_locations(
+    network: Union[nx.MultiDiGraph, CSRGraph], locations: List[Location]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Snap all locations to their nearest graph node in a single query.
+
+    Args:
+        network (Union[nx.MultiDiGraph, CSRGraph]): The road network.
+        locations (list[Location]): Locations with coordinates.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The nearest node ids and the snap distances in meters.
+    """
+    if not locations:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    node_ids, tree = get_node_index(network)
+    coords = np.radians([(loc.lat, loc.lon) for loc in locations])
+    distances, indices = tree.query(coords, k=1)
+    return node_ids[indices[:, 0]], distances[:, 0] * EARTH_RADIUS
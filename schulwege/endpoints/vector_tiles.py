@@ -0,0 +1,313 @@
+from collections import defaultdict
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import shutil
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+import streamlit as st
+
+from schulwege.components.maps import merge_polylines
+from schulwege.models.segment import Segment
+
+TILE_EXTENT = 4096
+TILE_LAYER = "segments"
+TILESETS = ("frequency", "modality")
+
+
+def get_tile_dir() -> str:
+    """Get the vector tile directory from environment variables."""
+    data_folder = os.getenv("DATA_FOLDER", "./data")
+    return os.getenv("TILE_DIR", os.path.join(data_folder, "tiles"))
+
+
+def get_tile_server_port() -> int:
+    """Get the port of the local tile server."""
+    return int(os.getenv("TILE_SERVER_PORT", "5174"))
+
+
+def get_tile_server_host() -> str:
+    """Get the address the local tile server binds to, only the local host by default."""
+    return os.getenv("TILE_SERVER_HOST", "127.0.0.1")
+
+
+def get_tile_server_url() -> str:
+    """Get the tile server URL as seen from the browser."""
+    return os.getenv("TILE_SERVER_URL", f"http://localhost:{get_tile_server_port()}")
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _message(field: int, data: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(data)) + data
+
+
+def _packed(field: int, values: List[int]) -> bytes:
+    return _message(field, b"".join(_varint(value) for value in values))
+
+
+def _value(value) -> bytes:
+    if isinstance(value, str):
+        return _message(1, value.encode())
+    return _key(5, 0) + _varint(value)
+
+
+def encode_line_geometry(lines: List[List[Tuple[int, int]]]) -> List[int]:
+    """Encode lines of tile coordinates as MVT geometry commands."""
+    commands = []
+    cursor = (0, 0)
+    for line in lines:
+        commands.append(9)  # MoveTo, one point
+        commands.extend((_zigzag(line[0][0] - cursor[0]), _zigzag(line[0][1] - cursor[1])))
+        commands.append(((len(line) - 1) << 3) | 2)  # LineTo
+        for previous, point in zip(line, line[1:]):
+            commands.extend((_zigzag(point[0] - previous[0]), _zigzag(point[1] - previous[1])))
+        cursor = line[-1]
+    return commands
+
+
+def encode_tile(features: List[Tuple[dict, List[List[Tuple[int, int]]]]]) -> bytes:
+    """Encode line features as a Mapbox Vector Tile with a single layer.
+
+    Args:
+        features (List[Tuple[dict, List[List[Tuple[int, int]]]]]): The properties and
+            the lines in tile coordinates of every feature.
+    Returns:
+        bytes: The protobuf encoded tile.
+    """
+    keys, values = {}, {}
+    encoded_features = []
+    for i, (properties, lines) in enumerate(features):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(value, len(values)))
+        encoded_features.append(
+            _message(
+                2,
+                _key(1, 0)
+                + _varint(i + 1)
+                + _packed(2, tags)
+                + _key(3, 0)
+                + _varint(2)  # LINESTRING
+                + _packed(4, encode_line_geometry(lines)),
+            )
+        )
+    layer = (
+        _key(15, 0)
+        + _varint(2)
+        + _message(1, TILE_LAYER.encode())
+        + b"".join(encoded_features)
+        + b"".join(_message(3, key.encode()) for key in keys)
+        + b"".join(_message(4, _value(value)) for value in values)
+        + _key(5, 0)
+        + _varint(TILE_EXTENT)
+    )
+    return _message(3, layer)
+
+
+def to_tile_coordinates(lat: np.ndarray, lon: np.ndarray, zoom: int) -> np.ndarray:
+    """Project coordinates to Web Mercator in units of tile extents at a zoom level."""
+    scale = 2**zoom * TILE_EXTENT
+    lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = (lon + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * scale
+    return np.column_stack((np.round(x), np.round(y))).astype(np.int64)
+
+
+def tile_polylines(
+    polylines: List[Tuple[List[Tuple[float, float]], dict]], zoom: int
+) -> Dict[Tuple[int, int], bytes]:
+    """Cut polylines into the vector tiles of a zoom level.
+
+    Every edge is added to each tile its bounding box touches, clients clip at the tile
+    border. Features with equal properties are combined per tile, and edges that vanish
+    at the zoom level are left out.
+
+    Returns:
+        Dict[Tuple[int, int], bytes]: The encoded tiles by their x and y index.
+    """
+    tiles = defaultdict(lambda: defaultdict(list))
+    for polyline, properties in polylines:
+        lat, lon = np.array(polyline).T
+        points = to_tile_coordinates(lat, lon, zoom)
+        first_tiles = points[:-1] // TILE_EXTENT
+        last_tiles = points[1:] // TILE_EXTENT
+        group = tuple(properties.items())
+        for start, end, first_tile, last_tile in zip(
+            points[:-1].tolist(), points[1:].tolist(), first_tiles.tolist(), last_tiles.tolist()
+        ):
+            if start == end:
+                continue
+            for tile_x in range(
+                min(first_tile[0], last_tile[0]), max(first_tile[0], last_tile[0]) + 1
+            ):
+                for tile_y in range(
+                    min(first_tile[1], last_tile[1]), max(first_tile[1], last_tile[1]) + 1
+                ):
+                    offset_x, offset_y = tile_x * TILE_EXTENT, tile_y * TILE_EXTENT
+                    local_start = (start[0] - offset_x, start[1] - offset_y)
+                    local_end = (end[0] - offset_x, end[1] - offset_y)
+                    lines = tiles[(tile_x, tile_y)][group]
+                    if lines and lines[-1][-1] == local_start:
+                        lines[-1].append(local_end)
+                    else:
+                        lines.append([local_start, local_end])
+    return {
+        tile: encode_tile([(dict(group), lines) for group, lines in features.items()])
+        for tile, features in tiles.items()
+    }
+
+
+def get_project_tile_dir(project_id: int) -> str:
+    return os.path.join(get_tile_dir(), str(project_id))
+
+
+def has_project_tiles(project_id: int) -> bool:
+    """Check whether vector tiles were built for a project."""
+    return os.path.exists(os.path.join(get_project_tile_dir(project_id), "meta.json"))
+
+
+def load_project_tile_meta(project_id: int) -> dict:
+    """Load the metadata of the vector tiles of a project."""
+    with open(os.path.join(get_project_tile_dir(project_id), "meta.json")) as f:
+        return json.load(f)
+
+
+def delete_project_tiles(project_id: int) -> None:
+    """Remove the vector tiles of a project, if there are any."""
+    shutil.rmtree(get_project_tile_dir(project_id), ignore_errors=True)
+
+
+def build_project_tiles(
+    project_id: int,
+    segments: List[Segment],
+    min_zoom: int = 11,
+    max_zoom: int = 16,
+    progress_callback=None,
+) -> str:
+    """Precompute the vector tiles of a project's segments.
+
+    Two tilesets are written below the project's tile directory: ``frequency`` with the
+    overlaid segments of all modalities and ``modality`` with the segments per modality.
+    Both are stored as ``{tileset}/{z}/{x}/{y}.pbf`` next to a ``meta.json`` that holds
+    the zoom range, bounds and value ranges needed for styling.
+
+    Returns:
+        str: The tile directory of the project.
+    """
+    out_dir = get_project_tile_dir(project_id)
+    delete_project_tiles(project_id)
+    if not segments:
+        return out_dir
+
+    segments_by_modality = defaultdict(list)
+    for segment in segments:
+        segments_by_modality[segment.modality].append(segment)
+    polylines = {
+        "frequency": [
+            (polyline, {"frequency": frequency})
+            for polyline, frequency in merge_polylines(segments)
+        ],
+        "modality": [
+            (polyline, {"modality": modality, "frequency": frequency})
+            for modality, modality_segments in segments_by_modality.items()
+            for polyline, frequency in merge_polylines(modality_segments)
+        ],
+    }
+
+    num_tiles = 0
+    for zoom in range(min_zoom, max_zoom + 1):
+        if progress_callback:
+            progress_callback(f"Erzeuge Vektorkacheln für Zoomstufe {zoom}...")
+        for tileset in TILESETS:
+            for (x, y), tile in tile_polylines(polylines[tileset], zoom).items():
+                tile_dir = os.path.join(out_dir, tileset, str(zoom), str(x))
+                os.makedirs(tile_dir, exist_ok=True)
+                with open(os.path.join(tile_dir, f"{y}.pbf"), "wb") as f:
+                    f.write(tile)
+                num_tiles += 1
+
+    lats = [lat for segment in segments for lat in (segment.lat_from, segment.lat_to)]
+    lons = [lon for segment in segments for lon in (segment.lon_from, segment.lon_to)]
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(
+            {
+                "min_zoom": min_zoom,
+                "max_zoom": max_zoom,
+                "bounds": [[min(lats), min(lons)], [max(lats), max(lons)]],
+                "frequencies": sorted(
+                    {properties["frequency"] for _, properties in polylines["frequency"]}
+                ),
+                "modalities": sorted(segments_by_modality, key=str),
+                "num_tiles": num_tiles,
+            },
+            f,
+            indent=4,
+        )
+    return out_dir
+
+
+class TileRequestHandler(SimpleHTTPRequestHandler):
+    """Serve tile files with CORS headers; missing tiles are answered as empty."""
+
+    extensions_map = {".pbf": "application/x-protobuf", ".json": "application/json"}
+
+    def end_headers(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        super().end_headers()
+
+    def send_error(self, code, message=None, explain=None):
+        if code == 404:
+            self.send_response(204)
+            self.end_headers()
+            return
+        super().send_error(code, message, explain)
+
+    def list_directory(self, path):
+        self.send_error(403)
+        return None
+
+    def log_message(self, format, *args):
+        pass
+
+
+@st.cache_resource(show_spinner=False)
+def start_tile_server() -> str:
+    """Start the local tile server once per process and get its URL.
+
+    If the port is already taken, another app process is assumed to serve the same
+    tile directory.
+    """
+    tile_dir = get_tile_dir()
+    os.makedirs(tile_dir, exist_ok=True)
+    try:
+        server = ThreadingHTTPServer(
+            (get_tile_server_host(), get_tile_server_port()),
+            partial(TileRequestHandler, directory=tile_dir),
+        )
+    except OSError:
+        return get_tile_server_url()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return get_tile_server_url()
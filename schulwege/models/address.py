@@ -0,0 +1,22 @@
+from typing import Optional
+
+from sqlalchemy import Float, ForeignKey, Integer, LargeBinary, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from schulwege.models.base import Base
+
+
+class ProjectAddress(Base):
+    """An address of a project with its geocoded location and the routes of external services."""
+
+    __tablename__ = "project_addresses"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), index=True)
+    address: Mapped[str] = mapped_column(String)
+    lat: Mapped[float] = mapped_column(Float)
+    lon: Mapped[float] = mapped_column(Float)
+    routes: Mapped[Optional[bytes]] = mapped_column(LargeBinary)
+
+    def __repr__(self):
+        return f"<ProjectAddress project_id={self.project_id} address={self.address}>"
@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from schulwege.models.base import Base
+
+
+class CachedGeocode(Base):
+    __tablename__ = "geocode_cache"
+
+    address: Mapped[str] = mapped_column(String, primary_key=True)
+    data: Mapped[str] = mapped_column(String)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<CachedGeocode address={self.address} created_at={self.created_at}>"
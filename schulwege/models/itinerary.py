@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from schulwege.models.base import Base
+
+
+class CachedItinerary(Base):
+    __tablename__ = "itinerary_cache"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    gtfs_version: Mapped[str] = mapped_column(String, index=True)
+    route: Mapped[str] = mapped_column(String)
+    modalities: Mapped[str] = mapped_column(String)
+    size: Mapped[int] = mapped_column(Integer, default=0)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, index=True)
+
+    def __repr__(self):
+        return f"<CachedItinerary key={self.key} gtfs_version={self.gtfs_version} size={self.size}>"
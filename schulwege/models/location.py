@@ -75,3 +75,12 @@ def new_location(data: Dict) -> Location:
         boundingbox=",".join(data.get("boundingbox")) if data.get("boundingbox") else None,
     )
     return location
+
+
+def location_to_dict(location: Location) -> Dict:
+    """Get the column values of a location that are needed to recreate it."""
+    return {
+        column.name: getattr(location, column.name)
+        for column in Location.__table__.columns
+        if column.name not in ("id", "project_id")
+    }
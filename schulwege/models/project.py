@@ -3,6 +3,7 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy import DateTime, Integer, ForeignKey, String
 from typing import List, Optional
 
+from schulwege.models.address import ProjectAddress
 from schulwege.models.base import Base
 from schulwege.models.location import Location
 from schulwege.models.segment import Segment
@@ -14,6 +15,8 @@ class Project(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    segment_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    version: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=1)
 
     main_location_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("locations.id"), nullable=True
@@ -29,6 +32,12 @@ class Project(Base):
         cascade="all, delete-orphan",
     )
 
+    addresses: Mapped[List["ProjectAddress"]] = relationship(
+        "ProjectAddress",
+        foreign_keys=[ProjectAddress.project_id],
+        cascade="all, delete-orphan",
+    )
+
     def get_name(self) -> str:
         return self.name or f"Projekt {self.id}"
 
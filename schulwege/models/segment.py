@@ -1,6 +1,6 @@
 from typing import Optional
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy import BigInteger, ForeignKey, Integer, String
 
 from schulwege.models.base import Base
 
@@ -15,6 +15,8 @@ class Segment(Base):
     lon_to: Mapped[float]
     frequency: Mapped[int] = mapped_column(Integer, default=0)
     modality: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    node_from: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    node_to: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
     project_id: Mapped[Optional[int]] = mapped_column(ForeignKey("projects.id"))
     project = relationship("Project", back_populates="segments")
 
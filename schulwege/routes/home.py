@@ -1,11 +1,30 @@
 import pandas as pd
 import streamlit as st
 from streamlit_router import StreamlitRouter
-from schulwege.components.table import TableButton, table
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from schulwege.components.table import TableButton, pagination, table
 from schulwege.components.header import header
 from schulwege.endpoints.database import get_session
+from schulwege.endpoints.jobs import discard_job, get_failed_jobs, get_unfinished_jobs, retry_job
+from schulwege.endpoints.vector_tiles import delete_project_tiles
 from schulwege.models.project import Project
 
+PAGE_SIZE = 20
+
+SORT_COLUMNS = {
+    "Erstellt am": Project.created_at,
+    "Name": Project.name,
+    "Segmente": Project.segment_count,
+}
+
+
+def delete_project(session, project_id: int):
+    session.delete(session.get(Project, project_id))
+    session.commit()
+    delete_project_tiles(project_id)
+    st.rerun()
+
 
 def home(router: StreamlitRouter):
 
@@ -17,8 +36,39 @@ def home(router: StreamlitRouter):
     with col2:
         if st.button("Neues Projekt erstellen →", type="primary"):
             router.redirect(*router.build("new"))
+    for job in get_unfinished_jobs():
+        st.info(f"Auftrag {job.id} wird bearbeitet: {job.progress}")
+    for job in get_failed_jobs():
+        job_cols = st.columns([6, 1, 1], vertical_alignment="center")
+        job_cols[0].error(f"Auftrag {job.id} ist fehlgeschlagen: {job.progress}")
+        if job_cols[1].button("Fortsetzen", key=f"job_{job.id}_retry"):
+            retry_job(job.id)
+            st.rerun()
+        if job_cols[2].button("Verwerfen", key=f"job_{job.id}_discard"):
+            discard_job(job.id)
+            st.rerun()
+
     session = get_session()
-    projects = session.query(Project).order_by(Project.created_at.desc()).all()
+    num_projects = session.scalar(select(func.count(Project.id)))
+    if num_projects == 0:
+        st.info(
+            "Es sind noch keine Projekte vorhanden. Erstellen Sie ein neues Projekt, um zu beginnen."
+        )
+        return
+
+    sort_cols = st.columns([2, 1, 5], vertical_alignment="bottom")
+    sort_by = sort_cols[0].selectbox("Sortieren nach", list(SORT_COLUMNS.keys()))
+    descending = sort_cols[1].toggle("Absteigend", value=True)
+    sort_column = SORT_COLUMNS[sort_by]
+
+    offset = pagination(num_projects, PAGE_SIZE, key="home_page")
+    projects = session.scalars(
+        select(Project)
+        .options(joinedload(Project.main_location))
+        .order_by(sort_column.desc() if descending else sort_column.asc(), Project.id.desc())
+        .offset(offset)
+        .limit(PAGE_SIZE)
+    ).all()
 
     df = pd.DataFrame(
         [
@@ -27,28 +77,21 @@ def home(router: StreamlitRouter):
                 "Name": project.get_name(),
                 "Standort": project.main_location.to_string() if project.main_location else "N/A",
                 "Erstellt am": project.created_at.strftime("%d.%m.%Y"),
-                "Segmente": len(project.segments),
+                "Segmente": project.segment_count or 0,
                 "Link": TableButton(
                     "Projekt anzeigen",
-                    lambda _: router.redirect(*router.build("project", {"id": project.id})),
+                    lambda _, project_id=project.id: router.redirect(
+                        *router.build("project", {"id": project_id})
+                    ),
                     key=f"project_{project.id}_view",
                 ),
                 "Löschen": TableButton(
                     "Projekt löschen",
-                    lambda _: (
-                        session.delete(session.get(Project, project.id)),
-                        session.commit(),
-                        st.rerun(),
-                    ),
+                    lambda _, project_id=project.id: delete_project(session, project_id),
                     key=f"project_{project.id}_delete",
                 ),
             }
             for project in projects
         ]
     )
-    if not df.empty:
-        table(df)
-    else:
-        st.info(
-            "Es sind noch keine Projekte vorhanden. Erstellen Sie ein neues Projekt, um zu beginnen."
-        )
+    table(df)
@@ -1,66 +1,16 @@
-import time
-from typing import Dict, List, Optional, Tuple, Union
 import streamlit as st
 from streamlit_router import StreamlitRouter
 
 from schulwege.components.table_upload import table_upload
 from schulwege.components.header import header
+from schulwege.components.job_status import job_status
 from schulwege.components.search_box import search_box
-from schulwege.endpoints.database import get_session
-from schulwege.endpoints.nominatim import get_locations, get_top_location_batch
-from schulwege.endpoints.routing import compute_segments
+from schulwege.endpoints.autocomplete import (
+    autocomplete_locations,
+    refresh_provisional_locations,
+)
+from schulwege.endpoints.jobs import submit_project_job
 from schulwege.models.location import Location
-from schulwege.models.project import Project
-
-
-def create_project(
-    main_location: Location,
-    project_name: Optional[str],
-    address_list: List[str],
-    progress_callback=None,
-    force: bool = False,
-) -> Optional[Project]:
-
-    locations = get_top_location_batch(
-        address_list,
-        progress_callback=lambda i, query: (
-            progress_callback(f"Geokodierung: {i+1}/{len(address_list)}: {query}")
-            if progress_callback
-            else None
-        ),
-    )
-    num_errors = sum(1 for loc in locations if loc is None)
-    error_locations = [address_list[i] for i, loc in enumerate(locations) if loc is None]
-    if num_errors > 0 and not force:
-        st.warning(
-            f"{num_errors} von {len(address_list)} Adressen konnten nicht gefunden werden. Korrigieren Sie die Adressen oder setzen Sie den Haken 'Fehlerhafte Adressen ignorieren' und probieren Sie es erneut.\n- "
-            + "\n- ".join(error_locations)
-        )
-        return None
-
-    locations = [loc for loc in locations if loc is not None]
-    segments = compute_segments(
-        main_location,
-        locations,
-        progress_callback=lambda p: (
-            progress_callback(f"Berechnung der Schulwege: {p}") if progress_callback else None
-        ),
-    )
-
-    session = get_session()
-    session.add(main_location)
-    session.add_all(segments)
-    project = Project(
-        name=project_name or main_location.to_string(),
-        main_location=main_location,
-        segments=segments,
-    )
-    session.add(project)
-    session.commit()
-    st.success(f"Projekt '{project.name}' wurde erfolgreich erstellt!")
-    if progress_callback:
-        progress_callback("Fertig!")
-    return project
 
 
 def new(router: StreamlitRouter):
@@ -91,7 +41,7 @@ def new(router: StreamlitRouter):
 
     main_location = search_box(
         "(1) Schule suchen",
-        search_callback=lambda x: get_locations(x, limit=5),
+        search_callback=lambda x: autocomplete_locations(x, limit=5),
         topN=5,
         format_func=lambda loc: loc.to_string(),
     )
@@ -156,16 +106,11 @@ def new(router: StreamlitRouter):
     )
 
     if st.session_state.form_progress >= 4 and st.button("Projekt erstellen"):
-        with st.status("Projekt wird erstellt...") as status:
-            project = create_project(
-                main_location,
-                project_name,
-                agg_address_list,
-                progress_callback=lambda p: status.update(label=p, state="running", expanded=True),
-                force=force_errors,
-            )
-            if project:
-                # wait 3s before redirecting
-                status.update(label="Weiterleitung...", state="complete", expanded=True)
-                time.sleep(3)
-                router.redirect(*router.build("project", {"id": project.id}))
+        st.session_state.project_job_id = submit_project_job(
+            main_location, project_name, agg_address_list, force=force_errors
+        )
+
+    if "project_job_id" in st.session_state:
+        job_status(router, st.session_state.project_job_id, "project_job_id")
+
+    refresh_provisional_locations()
@@ -1,17 +1,86 @@
+from datetime import datetime
+import os
+import time
+from typing import Tuple
+
 import streamlit as st
+import streamlit.components.v1 as components
 from streamlit_router import StreamlitRouter
-from streamlit_folium import st_folium
 
 from schulwege.components.header import header
 from schulwege.components.info_badges import info_badges
+from schulwege.components.job_status import job_status
 from schulwege.components.maps import (
+    EXPORT_FORMATS,
     export_project,
+    geojson_payload_size,
     segment_heatmap,
     segment_modality_map,
+    tile_heatmap,
+    tile_modality_map,
 )
+from schulwege.components.table_upload import table_upload
 from schulwege.endpoints.database import get_session
+from schulwege.endpoints.jobs import submit_update_job
+from schulwege.endpoints.segments import load_segment_frame
+from schulwege.endpoints.vector_tiles import (
+    has_project_tiles,
+    load_project_tile_meta,
+    start_tile_server,
+)
 from schulwege.models.project import Project
 
+MAP_TYPES = {
+    "Heatmap Frequenz": (segment_heatmap, tile_heatmap),
+    "Modalität": (segment_modality_map, tile_modality_map),
+}
+
+
+@st.cache_resource(
+    max_entries=int(os.getenv("MAP_CACHE_ENTRIES", "16")), show_spinner="Karte wird erstellt..."
+)
+def render_project_map(
+    project_id: int, created_at: datetime, map_type: str, version: int
+) -> Tuple[str, str, str]:
+    """Build and render a project map once per project version.
+
+    Entries are keyed by the project version, so maps of outdated versions are never hit
+    again and age out of the bounded cache. SQLite reuses the ids of deleted projects,
+    so the creation time tells a new project apart from a deleted one with the same id.
+
+    Returns:
+        Tuple[str, str, str]: The map HTML, the legend HTML and a caption with build stats.
+    """
+    segment_map, tile_map = MAP_TYPES[map_type]
+    start = time.perf_counter()
+    if has_project_tiles(project_id):
+        meta = load_project_tile_meta(project_id)
+        map, legend_html = tile_map(f"{start_tile_server()}/{project_id}", meta)
+        payload = (
+            f"Vektorkacheln: {meta['num_tiles']} Kacheln für Zoomstufen "
+            f"{meta['min_zoom']}–{meta['max_zoom']}"
+        )
+    else:
+        session = get_session()
+        map, legend_html = segment_map(session.get(Project, project_id).segments)
+        session.close()
+        payload = f"Kartendaten: {geojson_payload_size(map) / 1024 / 1024:.1f} MB"
+    html = map.get_root().render()
+    return html, legend_html, f"{payload}, erstellt in {time.perf_counter() - start:.2f} s"
+
+
+@st.cache_resource(max_entries=int(os.getenv("EXPORT_CACHE_ENTRIES", "4")), show_spinner=False)
+def build_project_export(
+    project_id: int, created_at: datetime, export_format: str, version: int
+) -> bytes:
+    """Build a project export once per project version, keyed like ``render_project_map``."""
+    session = get_session()
+    data = export_project(
+        session.get(Project, project_id), load_segment_frame(session, project_id), export_format
+    )
+    session.close()
+    return data
+
 
 def project(router: StreamlitRouter, id: int):
 
@@ -28,47 +97,74 @@ def project(router: StreamlitRouter, id: int):
         },
     )
     info = [
-        f"**Standort**: {project.main_location.to_string()}",
+        (
+            f"**Standort**: {project.main_location.to_string()}"
+            if project.main_location
+            else "**Standort**: mehrere Schulen"
+        ),
         f"Erstellt am {project.created_at.strftime('%d.%m.%Y')}",
     ]
-    if len(project.segments) > 0:
-        info.append(f"{len(project.segments)} Segmente")
+    if project.segment_count:
+        info.append(f"{project.segment_count} Segmente")
 
     info_badges(info)
 
     cols = st.columns([1, 3], gap="large")
 
-    maps = {
-        "Heatmap Frequenz": segment_heatmap,
-        "Modalität": segment_modality_map,
-    }
-
     with cols[0]:
         selected_map = st.selectbox(
             "Kartenansicht auswählen",
-            list(maps.keys()),
+            list(MAP_TYPES.keys()),
         )
-        tmp_file = export_project(project)
-        with open(tmp_file, "rb") as f:
+        export_format = st.selectbox("Exportformat", list(EXPORT_FORMATS.keys()))
+        export_key = (project.id, project.created_at, export_format, project.version)
+        if st.button("Export erstellen"):
+            st.session_state.project_export = export_key
+        if st.session_state.get("project_export") == export_key:
+            extension, mime = EXPORT_FORMATS[export_format]
+            with st.spinner("Export wird erstellt..."):
+                data = build_project_export(*export_key)
             st.download_button(
                 label="Download Projektdaten",
-                data=f,
-                file_name=f"projekt_{project.id}.zip",
-                mime="application/zip",
+                data=data,
+                file_name=f"projekt_{project.id}.{extension}",
+                mime=mime,
+            )
+
+        update_key = f"update_job_id_{project.id}"
+        with st.expander("Adressliste aktualisieren"):
+            st.caption(
+                "Nur neue Adressen werden geokodiert und für die ÖPNV-Wege abgefragt, die "
+                "Segmente werden für die ganze Liste neu berechnet."
+            )
+            df_addresses = table_upload("Neue Adressliste hochladen")
+            address_columns = st.multiselect(
+                "Spalte(n) mit Adressen auswählen (Reihenfolge)",
+                options=df_addresses.columns.tolist(),
+                key="update_address_columns",
+            )
+            force_errors = st.checkbox(
+                "Fehlerhafte Adressen ignorieren", value=False, key="update_force_errors"
             )
+            if st.button("Adressen aktualisieren", disabled=not address_columns):
+                address_list = df_addresses.apply(
+                    lambda row: " ".join(row[address_columns].values.astype(str)), axis=1
+                ).tolist()
+                st.session_state[update_key] = submit_update_job(
+                    project.id, address_list, force=force_errors
+                )
+        if update_key in st.session_state:
+            job_status(router, st.session_state[update_key], update_key)
 
     with cols[1]:
-        map_function = maps[selected_map]
-        map, legend_html = map_function(project.segments)
+        map_html, legend_html, caption = render_project_map(
+            project.id, project.created_at, selected_map, project.version
+        )
         st.markdown(
             f"""
             <div style="font-weight: bold; margin-bottom: 8px;">{legend_html}</div>
             """,
             unsafe_allow_html=True,
         )
-        st_folium(
-            map,
-            use_container_width=True,
-            height=600,
-            returned_objects=[],
-        )
+        components.html(map_html, height=600)
+        st.caption(caption)
@@ -0,0 +1,314 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+import pandas as pd
+import streamlit as st
+
+from schulwege.endpoints.assignment import create_assignment_projects
+from schulwege.endpoints.database import get_engine, get_session, init_db
+from schulwege.endpoints.graph_store import NETWORK_FILTERS, has_graph_store, load_graph_store
+from schulwege.endpoints.jobs import (
+    add_job,
+    get_job,
+    init_job_worker,
+    project_job_payload,
+    run_project_job,
+)
+from schulwege.endpoints.routing import NETWORK_MODALITIES
+from schulwege.models.job import Job
+from schulwege.models.location import Location
+from schulwege.models.project import Project
+
+SCHOOL_COLUMNS = {
+    "name": "Schulname",
+    "number": "Schulnumme",
+    "coordinates": "Geo Point",
+    "road": "Strasse",
+    "postcode": "Plz",
+    "city": "Ort",
+}
+
+
+def serve(streamlit_args: List[str]):
+    """Start the web application with Streamlit."""
+    from streamlit.web import cli as stcli
+
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    port = os.getenv("APP_PORT", os.getenv("FRONTEND_PORT", "5173"))
+    sys.argv = ["streamlit", "run", app, "--server.port", port, *streamlit_args]
+    sys.exit(stcli.main())
+
+
+def read_table(path: str) -> pd.DataFrame:
+    """Read a CSV (any common delimiter) or Excel table."""
+    if path.endswith((".xlsx", ".xls")):
+        return pd.read_excel(path)
+    return pd.read_csv(path, sep=None, engine="python")
+
+
+def load_schools(path: str) -> List[Tuple[str, Location]]:
+    """Load the schools of a school list, e.g. ``schulen_potsdam.csv``.
+
+    Schools without coordinates are left out.
+
+    Returns:
+        List[Tuple[str, Location]]: The number and location of every school.
+    """
+    df = pd.read_csv(path, sep=";", dtype=str).fillna("")
+    schools = []
+    for _, row in df.iterrows():
+        if not row[SCHOOL_COLUMNS["coordinates"]]:
+            continue
+        lat, lon = (float(value) for value in row[SCHOOL_COLUMNS["coordinates"]].split(","))
+        location = Location(
+            name=row[SCHOOL_COLUMNS["name"]],
+            lat=lat,
+            lon=lon,
+            osm_id=0,
+            road=row.get(SCHOOL_COLUMNS["road"]) or None,
+            postcode=row.get(SCHOOL_COLUMNS["postcode"]) or None,
+            city=row.get(SCHOOL_COLUMNS["city"]) or None,
+        )
+        schools.append((row[SCHOOL_COLUMNS["number"]], location))
+    return schools
+
+
+def find_address_list(address_dir: str, school_number: str, school_name: str) -> Optional[str]:
+    """Find the address list of a school, named by its number or name."""
+    for stem in (school_number, school_name):
+        for extension in (".csv", ".xlsx", ".xls"):
+            path = os.path.join(address_dir, f"{stem}{extension}")
+            if stem and os.path.exists(path):
+                return path
+    return None
+
+
+def join_address_columns(df: pd.DataFrame, columns: Optional[List[str]] = None) -> List[str]:
+    """Join the address columns (the first column by default) of an address list."""
+    columns = columns or [df.columns[0]]
+    return df[columns].astype(str).apply(lambda row: " ".join(row.values), axis=1).tolist()
+
+
+def load_address_list(path: str, columns: Optional[List[str]] = None) -> List[str]:
+    return join_address_columns(read_table(path), columns)
+
+
+def print_messages():
+    """Print the messages that are shown on the page in the web application."""
+    st.warning = st.success = lambda body, *args, **kwargs: print(body)
+
+
+def init_batch_worker():
+    """Prepare a batch worker process.
+
+    The graph stores are memory-mapped read-only once per worker. All workers map the
+    same files, so they share the pages of one road graph in the page cache instead of
+    each holding its own copy.
+    """
+    init_job_worker()
+    for network_type in NETWORK_FILTERS:
+        if has_graph_store(network_type):
+            load_graph_store(network_type)
+
+
+def batch(args: argparse.Namespace):
+    """Create a project for every school with an address list on a process pool."""
+    init_db(get_engine())
+    missing_stores = [nt for nt in NETWORK_FILTERS if not has_graph_store(nt)]
+    if missing_stores:
+        print(
+            f"No graph store for {', '.join(missing_stores)}, every worker downloads these "
+            "networks from Overpass. Run ./scripts/build_graph_store.sh first to share one graph."
+        )
+
+    jobs: Dict[int, str] = {}
+    for school_number, location in load_schools(args.schools):
+        if args.only and school_number not in args.only:
+            continue
+        path = find_address_list(args.addresses, school_number, location.name)
+        if path is None:
+            print(f"Skipping {location.name} ({school_number}): no address list")
+            continue
+        try:
+            address_list = load_address_list(path, args.address_columns)
+        except KeyError as e:
+            print(f"Skipping {location.name} ({school_number}): missing address column {e}")
+            continue
+        job_id = add_job(project_job_payload(location, location.name, address_list, args.force))
+        jobs[job_id] = location.name
+    if not jobs:
+        print("No schools to process.")
+        return
+
+    print(f"Processing {len(jobs)} schools on {args.workers} workers...")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_batch_worker,
+    ) as executor:
+        futures = {executor.submit(run_project_job, job_id): job_id for job_id in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            job_id = futures[future]
+            try:
+                project_id = future.result()
+            except Exception as e:
+                print(f"Worker of {jobs[job_id]} crashed: {e}")
+                project_id = None
+            # a job the web process has claimed meanwhile is not run here
+            status = f"project {project_id}" if project_id is not None else get_job(job_id).status
+            print(f"[{done}/{len(jobs)}] {jobs[job_id]}: {status}")
+    total = time.perf_counter() - start
+
+    session = get_session()
+    rows = []
+    for job_id, name in jobs.items():
+        job = session.get(Job, job_id)
+        project = session.get(Project, job.project_id) if job.project_id else None
+        rows.append(
+            {
+                "Job": job_id,
+                "School": name,
+                "Status": job.status,
+                "Project": job.project_id,
+                "Segments": project.segment_count if project else None,
+                "Seconds": (
+                    round((job.finished_at - job.started_at).total_seconds(), 1)
+                    if job.started_at and job.finished_at
+                    else None
+                ),
+            }
+        )
+    session.close()
+    summary = pd.DataFrame(rows).sort_values("Seconds", ascending=False)
+    print(summary.to_string(index=False))
+    print(
+        f"{(summary['Status'] == 'done').sum()}/{len(summary)} schools done in {total:.1f} s, "
+        f"{summary['Seconds'].sum():.1f} s of worker time"
+    )
+    if args.summary:
+        summary.to_csv(args.summary, index=False)
+    failed = summary[summary["Status"] == "failed"]
+    if len(failed):
+        print(f"Failed jobs can be resumed in the web application: {failed['Job'].tolist()}")
+
+
+def assign(args: argparse.Namespace):
+    """Assign a city-wide address list to the schools and store the school projects."""
+    init_db(get_engine())
+    print_messages()
+    schools = load_schools(args.schools)
+    df = read_table(args.addresses)
+    address_list = join_address_columns(df, args.address_columns)
+    assigned_schools = None
+    if args.school_column:
+        school_index = {number: i for i, (number, _) in enumerate(schools)}
+        assigned_schools = [school_index.get(str(number)) for number in df[args.school_column]]
+        unknown = sum(1 for school in assigned_schools if school is None)
+        if unknown:
+            print(f"{unknown} addresses without a known school are assigned to the nearest one.")
+
+    start = time.perf_counter()
+    projects = create_assignment_projects(
+        [location for _, location in schools],
+        address_list,
+        args.name,
+        modality=args.modality,
+        assigned_schools=assigned_schools,
+        progress_callback=print,
+        force=args.force,
+    )
+    if projects is None:
+        return
+    for project in projects:
+        print(f"{project.id:>6} {project.name}: {project.segment_count} segments")
+    print(f"Done in {time.perf_counter() - start:.1f} s")
+
+
+def main():
+    load_dotenv()
+    data_folder = os.getenv("DATA_FOLDER", "./data")
+    parser = argparse.ArgumentParser(
+        prog="schulwege", description="Compute frequently used school routes."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser("serve", help="Start the web application (default).")
+    serve_parser.add_argument("streamlit_args", nargs=argparse.REMAINDER)
+    batch_parser = subparsers.add_parser(
+        "batch", help="Create the projects of many schools without the web application."
+    )
+    batch_parser.add_argument(
+        "--schools",
+        default=os.path.join(data_folder, "schools", "schulen_potsdam.csv"),
+        help="School list as downloaded by ./scripts/download_schools.sh.",
+    )
+    batch_parser.add_argument(
+        "--addresses",
+        required=True,
+        help="Directory with one address list (CSV or Excel) per school, named by the "
+        "school number or name.",
+    )
+    batch_parser.add_argument(
+        "--address-columns",
+        nargs="+",
+        help="Columns joined to the address, in order (default: the first column).",
+    )
+    batch_parser.add_argument(
+        "--only", nargs="+", help="Only process the schools with these school numbers."
+    )
+    batch_parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("JOB_WORKERS", "2")),
+        help="Number of schools computed at the same time.",
+    )
+    batch_parser.add_argument(
+        "--force", action="store_true", help="Ignore addresses that cannot be found."
+    )
+    batch_parser.add_argument("--summary", help="Write the timing summary to this CSV file.")
+    assign_parser = subparsers.add_parser(
+        "assign",
+        help="Assign a city-wide address list to the schools in one multi-source search.",
+    )
+    assign_parser.add_argument(
+        "--schools",
+        default=os.path.join(data_folder, "schools", "schulen_potsdam.csv"),
+        help="School list as downloaded by ./scripts/download_schools.sh.",
+    )
+    assign_parser.add_argument(
+        "--addresses", required=True, help="Address list (CSV or Excel) of the whole city."
+    )
+    assign_parser.add_argument(
+        "--address-columns",
+        nargs="+",
+        help="Columns joined to the address, in order (default: the first column).",
+    )
+    assign_parser.add_argument(
+        "--school-column",
+        help="Column with the school number of every address, empty for the nearest school.",
+    )
+    assign_parser.add_argument(
+        "--modality", default="walk", choices=list(NETWORK_MODALITIES.keys())
+    )
+    assign_parser.add_argument("--name", default="Schulzuordnung", help="Project name.")
+    assign_parser.add_argument(
+        "--force", action="store_true", help="Ignore addresses that cannot be found."
+    )
+    args = parser.parse_args()
+
+    if args.command == "batch":
+        batch(args)
+    elif args.command == "assign":
+        assign(args)
+    else:
+        serve(getattr(args, "streamlit_args", []))
+
+
+if __name__ == "__main__":
+    main()
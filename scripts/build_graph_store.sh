@@ -0,0 +1,19 @@
+#!/usr/bin/env bash
+
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+if [ -f $SCRIPT_DIR/../.env ]; then
+    export $(grep -v '^#' $SCRIPT_DIR/../.env | xargs)
+fi
+
+DATA_FOLDER=${DATA_FOLDER:-./data}
+OTP_DATA_DIR=${OTP_DATA_DIR:-./data/opentripplanner}
+GRAPH_STORE_DIR=${GRAPH_STORE_DIR:-${DATA_FOLDER}/graph_store}
+
+OSM_FILE="$OTP_DATA_DIR/osm.pbf"
+if [ ! -f "$OSM_FILE" ]; then
+  echo "OSM PBF not found at $OSM_FILE, run ./scripts/download_otp.sh first."
+  exit 1
+fi
+
+python -m schulwege.endpoints.graph_store --pbf "$OSM_FILE" --out "$GRAPH_STORE_DIR"
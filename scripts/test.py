@@ -0,0 +1,8 @@
+import os
+import sys
+
+import pytest
+
+if __name__ == "__main__":
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    sys.exit(pytest.main([os.path.join(root, "tests"), *sys.argv[1:]]))
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+import streamlit as st
+
+from schulwege.benchmark import synthetic_addresses, synthetic_graph
+from schulwege.endpoints import projects, routing
+from schulwege.endpoints.database import get_engine, init_db
+from schulwege.endpoints.graph_store import NETWORK_FILTERS, write_graph_store
+from schulwege.models.location import Location
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def environment(tmp_path, monkeypatch):
+    """Keep the data written by a test in its temporary directory."""
+    monkeypatch.setenv("MODEL_CONFIG_FILE", os.path.join(ROOT, "model_config.json"))
+    monkeypatch.setenv("DATA_FOLDER", str(tmp_path))
+    monkeypatch.setenv("GRAPH_STORE_DIR", str(tmp_path / "graph_store"))
+    monkeypatch.setenv("TILE_DIR", str(tmp_path / "tiles"))
+    monkeypatch.setenv("OTP_DATA_DIR", str(tmp_path / "opentripplanner"))
+    # cached resources such as memory-mapped graph stores belong to the previous test
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Point the application at a fresh SQLite database."""
+    monkeypatch.setenv("SQL_DATABASE_URL", f"sqlite:///{tmp_path / 'schulwege.db'}")
+    st.cache_resource.clear()
+    init_db(get_engine())
+    yield
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def graph_store():
+    """Write a jittered street grid of 12 x 12 km as the graph store of every network type.
+
+    Returns:
+        np.ndarray: The (lat, lon) coordinates of all nodes.
+    """
+    sources, targets, node_ids, node_coords = synthetic_graph("grid", 900, 400.0, seed=1)
+    for network_type in NETWORK_FILTERS:
+        write_graph_store(
+            os.environ["GRAPH_STORE_DIR"],
+            network_type,
+            sources,
+            targets,
+            node_ids,
+            node_coords,
+            source="test grid",
+        )
+    st.cache_resource.clear()
+    yield node_coords
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def services(graph_store, monkeypatch):
+    """Answer geocoding and public transport requests locally and record them."""
+    coordinates = synthetic_addresses(graph_store, 300, seed=2)
+    requests = {"geocoding": [], "public_transport": []}
+
+    def get_top_location_batch(address_list, progress_callback=None):
+        requests["geocoding"].extend(address_list)
+        return [
+            Location(
+                name=address, lat=coordinates[address][0], lon=coordinates[address][1], osm_id=0
+            )
+            for address in address_list
+        ]
+
+    def get_public_transport_routes(origin, destinations, date, time, transport_modes, **kwargs):
+        requests["public_transport"].extend(destination.name for destination in destinations)
+        results = []
+        for destination in destinations:
+            stop = ((origin.lat + destination.lat) / 2, origin.lon)
+            route = [(origin.lat, origin.lon), (origin.lat, stop[1] + 0.001), stop]
+            route += [(stop[0], destination.lon), (destination.lat, destination.lon)]
+            results.append((route, ["oepnv-walk", "oepnv-walk", "bus", "oepnv-walk", "oepnv-walk"]))
+        return results, {}
+
+    monkeypatch.setattr(projects, "get_top_location_batch", get_top_location_batch)
+    monkeypatch.setattr(routing, "get_public_transport_routes", get_public_transport_routes)
+    return list(coordinates), requests
@@ -0,0 +1,87 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from schulwege.benchmark import meters_to_coordinates, synthetic_addresses
+from schulwege.endpoints.assignment import compute_school_assignment, create_assignment_projects
+from schulwege.endpoints.database import get_session
+from schulwege.endpoints.routing import compute_network_flows, get_road_network
+from schulwege.endpoints.segments import segment_to_row
+from schulwege.endpoints.snapping import snap_locations
+from schulwege.models.location import Location
+from schulwege.models.project import Project
+
+
+@pytest.fixture
+def schools(graph_store):
+    coordinates = meters_to_coordinates(np.array([-2000.0, 2500.0]), np.array([500.0, -1000.0]))
+    return [
+        Location(name=f"Schule {i + 1}", lat=float(lat), lon=float(lon), osm_id=0)
+        for i, (lat, lon) in enumerate(coordinates)
+    ]
+
+
+@pytest.fixture
+def locations(graph_store):
+    coordinates = synthetic_addresses(graph_store, 300, seed=4)
+    return [
+        Location(name=address, lat=lat, lon=lon, osm_id=0)
+        for address, (lat, lon) in coordinates.items()
+    ]
+
+
+def nearest_schools(network, schools, locations) -> np.ndarray:
+    school_nodes, _ = snap_locations(network, schools)
+    nodes, _ = snap_locations(network, locations)
+    positions = network.index_of(nodes)
+    dist = [network.shortest_path_tree(node)[0][positions] for node in school_nodes]
+    return np.argmin(dist, axis=0)
+
+
+def assert_school_segments(network, schools, locations, expected, school_segments):
+    """Every school carries the tree flows of its own shortest path tree to its locations."""
+    for school, segments in enumerate(school_segments):
+        members = [location for location, s in zip(locations, expected) if s == school]
+        flows = compute_network_flows(
+            network, schools[school], members, 0, float("inf"), "Laufwege", "Laufen"
+        )
+        assert Counter(map(segment_to_row, segments)) == Counter(map(segment_to_row, flows))
+
+
+def test_locations_are_assigned_to_their_nearest_school(schools, locations):
+    network = get_road_network(schools[0], schools[1:] + locations, network_type="walk")
+    expected = nearest_schools(network, schools, locations)
+
+    assignment, school_segments = compute_school_assignment(schools, locations)
+
+    assert set(expected.tolist()) == {0, 1}
+    assert assignment.tolist() == expected.tolist()
+    assert_school_segments(network, schools, locations, expected, school_segments)
+
+
+def test_given_schools_override_the_nearest_one(schools, locations):
+    network = get_road_network(schools[0], schools[1:] + locations, network_type="walk")
+    nearest = nearest_schools(network, schools, locations)
+    given = [i % 2 if i % 5 else None for i in range(len(locations))]
+    expected = np.array([n if g is None else g for g, n in zip(given, nearest.tolist())])
+
+    assignment, school_segments = compute_school_assignment(
+        schools, locations, assigned_schools=given
+    )
+
+    assert (expected != nearest).any()
+    assert assignment.tolist() == expected.tolist()
+    assert_school_segments(network, schools, locations, expected, school_segments)
+
+
+def test_assignment_projects_of_the_nearest_schools(database, services, schools):
+    addresses, _ = services
+
+    projects = create_assignment_projects(schools, addresses, "Stadt")
+
+    assert [project.name for project in projects] == ["Stadt", "Stadt: Schule 1", "Stadt: Schule 2"]
+    session = get_session()
+    counts = [session.get(Project, project.id).segment_count for project in projects]
+    session.close()
+    assert counts[0] == sum(counts[1:]) > 0
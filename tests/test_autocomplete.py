@@ -0,0 +1,80 @@
+import threading
+
+from schulwege.endpoints.autocomplete import Autocomplete
+
+
+def place(name: str) -> dict:
+    return {"display_name": name, "lat": "52.4", "lon": "13.06"}
+
+
+# Nominatim matches whole tokens and ranks places, so the results of a longer query
+# are no subset of the results of its prefixes.
+RESULTS = {
+    "pots": [place("Pots, Potsdamer Straße, Berlin")],
+    "potsdam": [place("Potsdam, Brandenburg"), place("Schule am Park, Potsdam")],
+    "potsdam schule": [
+        place("Schule am Park, Potsdam"),
+        place("Goethe-Schule, Potsdam"),
+    ],
+}
+
+
+class StandInSearch:
+    """Answer from ``RESULTS`` and record the queries; blocks while ``release`` is unset."""
+
+    def __init__(self):
+        self.queries = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, query: str, limit: int) -> list:
+        self.queries.append(query)
+        self.release.wait(timeout=5)
+        return RESULTS.get(query.casefold(), [])[:limit]
+
+
+def test_results_of_a_word_prefix_are_not_reused():
+    search = StandInSearch()
+    autocomplete = Autocomplete(search)
+
+    assert autocomplete.query("pots", 5, "client") == RESULTS["pots"]
+    for query in ("potsd", "potsda", "potsdam"):
+        autocomplete.query(query, 5, "client")
+
+    assert search.queries == ["pots", "potsd", "potsda", "potsdam"]
+    assert autocomplete.query("potsdam", 5, "client") == RESULTS["potsdam"]
+
+
+def test_provisional_results_are_replaced_by_the_search_results():
+    search = StandInSearch()
+    autocomplete = Autocomplete(search, provisional_after=0.05)
+    autocomplete.query("potsdam", 5, "client")
+
+    search.release.clear()
+    provisional = autocomplete.query("Potsdam Schule", 5, "client")
+    assert provisional == [place("Schule am Park, Potsdam")]
+    assert autocomplete.pending("Potsdam Schule", 5)
+
+    search.release.set()
+    assert autocomplete.wait("Potsdam Schule", 5)
+    assert not autocomplete.pending("Potsdam Schule", 5)
+    assert autocomplete.query("Potsdam Schule", 5, "client") == RESULTS["potsdam schule"]
+    assert search.queries == ["potsdam", "Potsdam Schule"]
+
+
+def test_identical_queries_share_one_request():
+    search = StandInSearch()
+    autocomplete = Autocomplete(search)
+    search.release.clear()
+
+    threads = [
+        threading.Thread(target=autocomplete.query, args=("potsdam", 5, f"client-{i}"))
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    search.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert search.queries == ["potsdam"]
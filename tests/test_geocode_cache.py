@@ -0,0 +1,15 @@
+from schulwege.endpoints import geocode_cache
+from schulwege.endpoints.geocode_cache import cache_geocodes, get_cached_geocodes
+
+
+def test_an_address_cached_by_another_worker_keeps_its_entry(database, monkeypatch):
+    cache_geocodes({"teststrasse 1": {"lat": "52.4"}})
+    # the other worker inserts after this one looked up the cache
+    monkeypatch.setattr(geocode_cache, "get_cached_geocodes", lambda addresses: {})
+
+    cache_geocodes({"teststrasse 1": {"lat": "52.5"}, "teststrasse 2": {"lat": "52.6"}})
+
+    assert get_cached_geocodes(["teststrasse 1", "teststrasse 2"]) == {
+        "teststrasse 1": {"lat": "52.4"},
+        "teststrasse 2": {"lat": "52.6"},
+    }
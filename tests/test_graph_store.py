@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+
+from schulwege.benchmark import CENTER, meters_to_coordinates, synthetic_graph
+from schulwege.endpoints.graph_store import clip_graph_store, load_graph_store, write_graph_store
+from schulwege.endpoints.routing import compute_network_routes, get_hull, get_road_network
+from schulwege.models.location import Location
+
+
+def test_clipped_networks_drop_isolated_way_fragments():
+    sources, targets, node_ids, node_coords = synthetic_graph("grid", 100, 100.0, seed=1)
+    # a way of two nodes in the middle of a block, not connected to any street
+    fragment_ids = np.array([9001, 9002])
+    fragment_coords = meters_to_coordinates(np.array([50.0, 60.0]), np.array([50.0, 50.0]))
+    write_graph_store(
+        os.environ["GRAPH_STORE_DIR"],
+        "walk",
+        np.concatenate((sources, fragment_ids)),
+        np.concatenate((targets, fragment_ids[::-1])),
+        np.concatenate((node_ids, fragment_ids)),
+        np.concatenate((node_coords, fragment_coords)),
+        source="test grid",
+    )
+    school = Location(name="Testschule", lat=CENTER[0], lon=CENTER[1], osm_id=0)
+    lat, lon = meters_to_coordinates(np.array([52.0]), np.array([52.0]))[0]
+    address = Location(name="Teststraße 1", lat=float(lat), lon=float(lon), osm_id=0)
+
+    network = clip_graph_store(load_graph_store("walk"), get_hull([school, address]))
+    routes = compute_network_routes(
+        get_road_network(school, [address], "walk"), school, [address], 0, float("inf"), "Laufwege"
+    )
+
+    assert not np.isin(fragment_ids, network.node_ids).any()
+    assert len(network) <= len(node_ids)
+    assert len(routes[0]) > 0
@@ -0,0 +1,109 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import json
+import threading
+
+from schulwege.endpoints import jobs
+from schulwege.endpoints.jobs import (
+    add_job,
+    beat_job,
+    claim_job,
+    get_job,
+    handle_broken_pool,
+    requeue_failed_job,
+    requeue_stale_jobs,
+    run_project_job,
+    update_job,
+)
+
+
+def test_a_job_is_claimed_once(database):
+    job_id = add_job({})
+
+    assert claim_job(job_id, "worker-1")
+    assert not claim_job(job_id, "worker-2")
+    job = get_job(job_id)
+    assert job.status == "running"
+    assert job.owner == "worker-1"
+
+
+def test_a_job_claimed_by_another_worker_is_not_run(database):
+    job_id = add_job({})
+    claim_job(job_id, "batch")
+
+    assert run_project_job(job_id) is None
+    job = get_job(job_id)
+    assert job.status == "running"
+    assert job.owner == "batch"
+
+
+def test_only_running_jobs_without_heartbeat_are_queued_again(database):
+    alive, abandoned = add_job({}), add_job({})
+    claim_job(alive, "worker-1")
+    claim_job(abandoned, "worker-2")
+    update_job(abandoned, heartbeat_at=datetime.now() - timedelta(hours=1))
+
+    requeue_stale_jobs(stale_after=60)
+
+    assert get_job(alive).status == "running"
+    assert get_job(abandoned).status == "queued"
+    assert get_job(abandoned).owner is None
+
+
+def test_the_heartbeat_is_renewed_while_a_job_runs(database):
+    job_id = add_job({})
+    claim_job(job_id, "worker-1")
+    claimed_at = get_job(job_id).heartbeat_at
+    stop = threading.Event()
+    thread = threading.Thread(target=beat_job, args=(job_id, "worker-1", stop, 0.01))
+    thread.start()
+    threading.Event().wait(0.1)
+    stop.set()
+    thread.join()
+
+    assert get_job(job_id).heartbeat_at > claimed_at
+
+
+def test_a_failed_job_is_queued_again_once(database):
+    job_id = add_job({"force": False})
+    update_job(job_id, status="failed", finished_at=datetime.now())
+
+    assert requeue_failed_job(job_id, force=True)
+    assert not requeue_failed_job(job_id, force=True)
+    job = get_job(job_id)
+    assert job.status == "queued"
+    assert job.finished_at is None
+    assert json.loads(job.payload)["force"] is True
+
+
+def test_a_dead_worker_fails_its_job_and_drops_the_pool(database, monkeypatch):
+    running, queued = add_job({}), add_job({})
+    claim_job(running, "worker-1")
+    cleared = []
+    monkeypatch.setattr(jobs.get_job_executor, "clear", lambda: cleared.append(True))
+    future = Future()
+    future.set_exception(BrokenProcessPool())
+
+    handle_broken_pool(running, future)
+    handle_broken_pool(queued, future)
+
+    assert cleared
+    assert get_job(running).status == "failed"
+    assert json.loads(get_job(running).messages)
+    assert get_job(queued).status == "queued"
+
+
+def test_a_broken_pool_is_replaced_on_submit(database, monkeypatch):
+    class BrokenExecutor:
+        def submit(self, *args):
+            raise BrokenProcessPool()
+
+    pools = [BrokenExecutor(), object()]
+    get_job_executor = lambda: pools[0]
+    get_job_executor.clear = lambda: pools.pop(0)
+    monkeypatch.setattr(jobs, "get_job_executor", get_job_executor)
+
+    jobs.submit_job(add_job({}))
+
+    assert len(pools) == 1
@@ -0,0 +1,33 @@
+import pytest
+import requests
+
+from schulwege.endpoints import nominatim
+from schulwege.endpoints.geocode_cache import get_cached_geocodes, normalize_address
+from schulwege.endpoints.nominatim import GeocodingError, get_top_location_batch
+
+
+def test_a_failed_request_keeps_the_results_of_the_batch(database, monkeypatch):
+    queries = [f"Teststraße {i}, Teststadt" for i in range(20)]
+    failing = {queries[3]}
+    sent = []
+
+    def search_nominatim(query, limit=10, session=None):
+        sent.append(query)
+        if query in failing:
+            raise requests.ConnectionError("Nominatim ist nicht erreichbar")
+        return [{"name": query, "lat": "52.4", "lon": "13.06", "osm_id": 1}]
+
+    monkeypatch.setattr(nominatim, "search_nominatim", search_nominatim)
+
+    with pytest.raises(GeocodingError) as error:
+        get_top_location_batch(queries)
+
+    assert list(error.value.errors) == [queries[3]]
+    cached = get_cached_geocodes([normalize_address(query) for query in queries])
+    assert len(cached) == len(queries) - 1
+
+    failing.clear()
+    sent.clear()
+    locations = get_top_location_batch(queries)
+    assert sent == [queries[3]]
+    assert [location.name for location in locations] == queries
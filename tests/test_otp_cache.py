@@ -0,0 +1,17 @@
+from schulwege.endpoints.otp_cache import cache_itineraries, get_cached_itineraries
+
+
+def test_caching_an_itinerary_again_replaces_it(database):
+    cache_itineraries({"key": ([(52.4, 13.06), (52.41, 13.07)], ["walk", "walk"])}, "v1")
+    cache_itineraries(
+        {
+            "key": ([(52.4, 13.06), (52.42, 13.08)], ["walk", "bus"]),
+            "other": ([(52.4, 13.06)], ["walk"]),
+        },
+        "v1",
+    )
+
+    assert get_cached_itineraries(["key", "other"], "v1") == {
+        "key": ([(52.4, 13.06), (52.42, 13.08)], ["walk", "bus"]),
+        "other": ([(52.4, 13.06)], ["walk"]),
+    }
@@ -0,0 +1,62 @@
+from collections import Counter
+import json
+import os
+
+import pytest
+from sqlalchemy import select
+
+from schulwege.benchmark import CENTER
+from schulwege.endpoints.database import get_session
+from schulwege.endpoints.projects import create_project, update_project_addresses
+from schulwege.endpoints.segments import segment_to_row
+from schulwege.models.location import Location
+from schulwege.models.project import Project
+from schulwege.models.segment import Segment
+
+
+@pytest.fixture
+def model_config(tmp_path, monkeypatch):
+    """Keep segments used by few routes, so small address lists cross the minimum."""
+    with open(os.environ["MODEL_CONFIG_FILE"]) as f:
+        config = json.load(f)
+    config["min_segment_frequency"] = 3
+    config_file = tmp_path / "model_config.json"
+    config_file.write_text(json.dumps(config))
+    monkeypatch.setenv("MODEL_CONFIG_FILE", str(config_file))
+    return config
+
+
+def stored_segments(project_id: int) -> Counter:
+    session = get_session()
+    segments = session.scalars(select(Segment).where(Segment.project_id == project_id)).all()
+    session.close()
+    return Counter(segment_to_row(segment) for segment in segments)
+
+
+@pytest.mark.parametrize("backend", ["csr", "networkx"])
+def test_updated_project_equals_a_fresh_build(
+    database, model_config, services, monkeypatch, backend
+):
+    monkeypatch.setenv("ROUTING_BACKEND", backend)
+    addresses, requests = services
+    school = Location(name="Testschule", lat=CENTER[0], lon=CENTER[1], osm_id=0)
+    initial = addresses[:200] + addresses[:5]
+    updated = addresses[40:260] + addresses[:5] + addresses[60:62]
+
+    project = create_project(school, "Vorher", initial)
+    requests["geocoding"].clear()
+    requests["public_transport"].clear()
+    update_project_addresses(project.id, updated)
+    added = addresses[200:260] + addresses[60:62]
+
+    assert sorted(requests["geocoding"]) == sorted(added)
+    assert set(requests["public_transport"]) <= set(added)
+    fresh = create_project(
+        Location(name="Testschule", lat=CENTER[0], lon=CENTER[1], osm_id=0), "Neu", updated
+    )
+    assert stored_segments(project.id) == stored_segments(fresh.id)
+    session = get_session()
+    project = session.get(Project, project.id)
+    assert project.version == 2
+    assert project.segment_count == session.get(Project, fresh.id).segment_count
+    session.close()
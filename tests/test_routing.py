@@ -0,0 +1,102 @@
+from collections import Counter
+import os
+
+import numpy as np
+import pytest
+import streamlit as st
+
+from schulwege.benchmark import CENTER, meters_to_coordinates, synthetic_addresses, synthetic_graph
+from schulwege.endpoints.graph_store import write_graph_store
+from schulwege.endpoints.routing import (
+    compute_network_flows,
+    compute_network_routes,
+    get_road_network,
+)
+from schulwege.endpoints.segments import segment_to_row
+from schulwege.models.location import Location
+
+
+@pytest.fixture
+def locations(graph_store):
+    coordinates = synthetic_addresses(graph_store, 300, seed=3)
+    return [
+        Location(name=address, lat=lat, lon=lon, osm_id=0)
+        for address, (lat, lon) in coordinates.items()
+    ]
+
+
+def network_flows(school, locations):
+    network = get_road_network(school, locations, network_type="walk")
+    return (
+        compute_network_flows(network, school, locations, 0, float("inf"), "Laufwege", "Laufen"),
+        network,
+    )
+
+
+def test_csr_and_networkx_flows_are_equal(locations, monkeypatch):
+    school = Location(name="Testschule", lat=CENTER[0], lon=CENTER[1], osm_id=0)
+    monkeypatch.setenv("ROUTING_BACKEND", "csr")
+    csr_segments, _ = network_flows(school, locations)
+    monkeypatch.setenv("ROUTING_BACKEND", "networkx")
+    networkx_segments, _ = network_flows(school, locations)
+
+    assert len(csr_segments) > 0
+    assert Counter(map(segment_to_row, csr_segments)) == Counter(
+        map(segment_to_row, networkx_segments)
+    )
+
+
+@pytest.mark.parametrize("backend", ["csr", "networkx"])
+def test_tree_flows_count_every_route(locations, monkeypatch, backend):
+    monkeypatch.setenv("ROUTING_BACKEND", backend)
+    school = Location(name="Testschule", lat=CENTER[0], lon=CENTER[1], osm_id=0)
+    segments, network = network_flows(school, locations)
+    routes = compute_network_routes(network, school, locations, 0, float("inf"), label="Laufwege")
+
+    route_edges = Counter(
+        (route[i], route[i + 1]) for route in routes for i in range(len(route) - 1)
+    )
+    flows = {
+        ((segment.lat_from, segment.lon_from), (segment.lat_to, segment.lon_to)): segment.frequency
+        for segment in segments
+    }
+    assert flows == dict(route_edges)
+
+
+@pytest.mark.parametrize("backend", ["csr", "networkx"])
+def test_unreachable_addresses_are_reported(monkeypatch, backend):
+    monkeypatch.setenv("ROUTING_BACKEND", backend)
+    sources, targets, node_ids, node_coords = synthetic_graph("grid", 100, 100.0, seed=1)
+    # a one-way spur in the middle of a block that can be left but not entered
+    spur = meters_to_coordinates(np.array([50.0]), np.array([50.0]))
+    nearest = node_ids[np.argmin(np.abs(node_coords - spur).sum(axis=1))]
+    write_graph_store(
+        os.environ["GRAPH_STORE_DIR"],
+        "walk",
+        np.append(sources, 9001),
+        np.append(targets, nearest),
+        np.append(node_ids, 9001),
+        np.concatenate((node_coords, spur)),
+        source="test grid",
+    )
+    warnings = []
+    monkeypatch.setattr(st, "warning", warnings.append)
+    school = Location(name="Testschule", lat=CENTER[0], lon=CENTER[1], osm_id=0)
+    lat, lon = meters_to_coordinates(np.array([52.0]), np.array([52.0]))[0]
+    address = Location(name="Hinterhof 1", lat=float(lat), lon=float(lon), osm_id=0)
+    others = [
+        Location(name="Teststraße 1", lat=float(lat), lon=float(lon), osm_id=0)
+        for lat, lon in node_coords[:3]
+    ]
+    locations = [address] + others
+
+    network = get_road_network(school, locations, network_type="walk")
+    routes = compute_network_routes(network, school, locations, 0, float("inf"), "Laufwege")
+    segments = compute_network_flows(
+        network, school, locations, 0, float("inf"), "Laufwege", "Laufen"
+    )
+
+    assert routes[0] == [] and all(routes[1:])
+    assert max(segment.frequency for segment in segments) == len(others)
+    assert len(warnings) == 2
+    assert all("Hinterhof 1" in warning for warning in warnings)